@@ -3,6 +3,7 @@ import streamlit as st
 from rag_backend import RAGBackend
 import pandas as pd
 import time
+import uuid
 
 # Initialize backend once
 @st.cache_resource
@@ -11,6 +12,19 @@ def load_backend():
 
 rag = load_backend()
 
+# Retrieval is cached per query and retrieval-level filters; department, sorting and
+# paging are applied to the cached results in memory, without another search or LLM call
+@st.cache_data(show_spinner=False, ttl=600, max_entries=256)
+def cached_retrieval(query, body_search, meeting_filter, avoid_schedule, sources, session_id):
+    return rag.retrieve(
+        query,
+        body_search=body_search,
+        meeting_filter=meeting_filter,
+        avoid_schedule=list(avoid_schedule) or None,
+        sources=list(sources) or None,
+        session_id=session_id
+    )
+
 # Page config
 st.set_page_config(page_title="Course Finder", layout="wide")
 
@@ -31,7 +45,12 @@ department_filter = st.sidebar.text_input(
 )
 
 meeting_day_filter = st.sidebar.text_input(
-    "Meeting Day (e.g. M, T, W, Th, F, TTh, MWF)", "", key="meeting_day_filter"
+    "Meeting Day (e.g. M, T, W, Th, F, TTh, MWF, TTh afternoon)", "", key="meeting_day_filter"
+)
+
+avoid_schedule_filter = st.sidebar.text_area(
+    "Avoid conflicts with (one meeting time per line, e.g. MWF 10-10:50a)",
+    "", key="avoid_schedule_filter"
 )
 
 body_search_filter = st.sidebar.text_area(
@@ -41,13 +60,24 @@ body_search_filter = st.sidebar.text_area(
 )
 
 k_results = st.sidebar.slider(
-    "Number of results", 5, 25, 10, key="k_results"
+    "Results per page", 5, 25, 10, key="k_results"
+)
+
+sort_by = st.sidebar.selectbox(
+    "Sort by", ["Similarity score", "Relevance (diversified)", "Course code", "Title"], key="sort_by"
 )
 
-sort_by_score = st.sidebar.checkbox(
-    "Sort by similarity score", value=True, key="sort_by_score"
+summary_mode = st.sidebar.radio(
+    "Answer summary", ["On request", "With every query"], key="summary_mode"
 )
 
+# Follow-ups ("only ones on Tuesday") refine the previous results instead of searching again
+follow_up = st.sidebar.checkbox(
+    "Refine previous results with follow-up questions", value=True, key="follow_up"
+)
+if "conversation_id" not in st.session_state or st.sidebar.button("Start new search", key="new_search"):
+    st.session_state["conversation_id"] = uuid.uuid4().hex
+
 # Query input
 query = st.text_input(
     "Enter your query:", 
@@ -59,54 +89,77 @@ if query:
     # ✅ Build refined query dynamically (only add filters if provided)
     refined_query_parts = [query]
 
-    if dataset_filter:
-        refined_query_parts.append(f"Dataset: {', '.join(dataset_filter)}")
-
-    if department_filter.strip():
-        refined_query_parts.append(f"Department: {department_filter.strip()}")
-
-    if meeting_day_filter.strip():
-        refined_query_parts.append(f"Meeting Day: {meeting_day_filter.strip()}")
-
     if body_search_filter.strip():
         refined_query_parts.append(f"Body Search: {body_search_filter.strip()}")
 
     refined_query = " | ".join(refined_query_parts)
 
+    retrieval_args = (
+        refined_query,
+        body_search_filter.strip() or None,
+        meeting_day_filter.strip() or None,
+        tuple(line.strip() for line in avoid_schedule_filter.splitlines() if line.strip()),
+        tuple(dataset_filter),
+        st.session_state["conversation_id"] if follow_up else None,
+    )
+
     with st.spinner("Retrieving courses..."):
         start_time = time.time()
-        results = rag.get_response(
-            refined_query,
-            body_search=body_search_filter.strip() if body_search_filter.strip() else None
-        )
+        retrieval = cached_retrieval(*retrieval_args)
         elapsed_time = time.time() - start_time
 
     # Show response time
-    st.markdown(f"⏱️ **Response Time:** {elapsed_time:.2f} seconds")
+    st.markdown(f"⏱️ **Retrieval Time:** {elapsed_time:.2f} seconds")
+    session = retrieval.get("session")
+    if session and session["follow_up"]:
+        st.caption(f"Refined the previous results (question {session['turn']}, {session['pool_size']} candidates).")
 
-    # Show generated answer
+    # Generated answer: only on request (or with every query), kept for this session
     st.subheader("Generated Answer")
-    st.info(results["answer"])
+    summaries = st.session_state.setdefault("summaries", {})
+    auto_summary = summary_mode == "With every query" and retrieval_args not in summaries
+    if st.button("Summarize these results", key="summarize") or auto_summary:
+        with st.spinner("Writing summary..."):
+            summaries[retrieval_args] = rag.summarize(retrieval)
+    summary = summaries.get(retrieval_args)
+    if summary:
+        if summary.get("degraded"):
+            st.warning("The answer model was too slow, so this summary lists the top matches directly.")
+        st.info(summary["answer"])
+    else:
+        st.caption("Browse the ranked courses below, or generate a written summary of them.")
 
     # Process retrieved courses
-    courses = results["retrieved_courses"]
-
-    # # ✅ Safeguard: filter results again after retrieval
-    # if dataset_filter:
-    #     courses = [c for c in courses if c.get("source") in dataset_filter]
+    courses = retrieval["retrieved_courses"]
 
-    # if department_filter:
-    #     courses = [c for c in courses if c.get("department", "").lower().startswith(department_filter.lower())]
-
-    # if meeting_day_filter:
-    #     courses = [c for c in courses if meeting_day_filter.lower() in c.get("time", "").lower()]
+    if department_filter.strip():
+        department = department_filter.strip().lower()
+        courses = [c for c in courses if c.get("department", "").lower().startswith(department)]
 
-    if sort_by_score:
+    if sort_by == "Similarity score":
         courses = sorted(courses, key=lambda x: x.get("score", 0), reverse=True)
-
-    courses = courses[:k_results]
-
-    st.subheader(f"📄 Retrieved Courses ({len(courses)})")
+    elif sort_by == "Course code":
+        courses = sorted(courses, key=lambda x: (x.get("department", ""), x.get("code", "")))
+    elif sort_by == "Title":
+        courses = sorted(courses, key=lambda x: x.get("title", "").lower())
+
+    total = len(courses)
+    pages = max(1, -(-total // k_results))
+    # Back to page 1 whenever the results or their filtering change; the widget
+    # takes its value from session state, so it gets no default of its own
+    results_view = (retrieval_args, department_filter.strip().lower(), sort_by, k_results)
+    if st.session_state.get("results_view") != results_view:
+        st.session_state["results_view"] = results_view
+        st.session_state["page"] = 1
+    elif st.session_state.get("page", 1) > pages:
+        st.session_state["page"] = pages
+    page = st.number_input("Page", min_value=1, max_value=pages, step=1, key="page") if pages > 1 else 1
+    first = (page - 1) * k_results
+    courses = courses[first:first + k_results]
+
+    st.subheader(f"📄 Retrieved Courses ({total})")
+    if total:
+        st.caption(f"Showing {first + 1}–{first + len(courses)} of {total}")
 
     if not courses:
         st.warning("No courses matched your filters.")
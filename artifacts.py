@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import hashlib
+from typing import Dict, Any, List
+
+
+ARTIFACT_FILE = "artifact.json"
+ARTIFACT_FORMAT = 1
+DATA_KINDS = ("brown_json", "lsu_json", "bulletin_pdf")
+
+
+class ArtifactError(RuntimeError):
+    """An index artifact is missing, corrupt, or was built for a different configuration."""
+
+
+def load_data_manifest(path: str) -> List[Dict[str, Any]]:
+    """
+    Read the data manifest: the list of source files an index is built from,
+    each ``{"path": ..., "kind": "brown_json" | "lsu_json" | "bulletin_pdf"}``.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    entries = manifest.get("data", [])
+    for entry in entries:
+        if entry.get("kind") not in DATA_KINDS:
+            raise ArtifactError(f"{path}: unknown kind {entry.get('kind')!r} for {entry.get('path')}")
+    return entries
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _artifact_files(version_path: str) -> Dict[str, str]:
+    files: Dict[str, str] = {}
+    for directory, _, names in os.walk(version_path):
+        for name in names:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, version_path).replace(os.sep, "/")
+            if relative != ARTIFACT_FILE:
+                files[relative] = sha256_file(path)
+    return dict(sorted(files.items()))
+
+
+def write_artifact(version_path: str, version: str, parameters: Dict[str, Any],
+                   data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Record what a built version contains: build parameters, the checksums of the
+    source data it was built from and of every file in the version directory.
+    """
+    artifact = {
+        "format": ARTIFACT_FORMAT,
+        "version": version,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "parameters": parameters,
+        "data": [
+            {**entry, "sha256": sha256_file(entry["path"]), "bytes": os.path.getsize(entry["path"])}
+            for entry in data if os.path.exists(entry["path"])
+        ],
+        "files": _artifact_files(version_path),
+    }
+    path = os.path.join(version_path, ARTIFACT_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(artifact, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    return artifact
+
+
+def verify_artifact(version_path: str, parameters: Dict[str, Any], check_files: bool = True) -> Dict[str, Any]:
+    """
+    Check a version directory before serving it: the artifact format, the build
+    parameters against ours and, optionally, every file checksum. Raises
+    ArtifactError on any mismatch; returns the artifact manifest otherwise.
+    """
+    path = os.path.join(version_path, ARTIFACT_FILE)
+    if not os.path.exists(path):
+        raise ArtifactError(f"{version_path} has no {ARTIFACT_FILE}; it was not produced by build_index.py")
+    with open(path, "r", encoding="utf-8") as f:
+        artifact = json.load(f)
+
+    if artifact.get("format") != ARTIFACT_FORMAT:
+        raise ArtifactError(f"{version_path}: artifact format {artifact.get('format')}, expected {ARTIFACT_FORMAT}")
+    mismatched = {
+        key: (artifact["parameters"].get(key), value)
+        for key, value in parameters.items() if artifact["parameters"].get(key) != value
+    }
+    if mismatched:
+        details = ", ".join(f"{key}: built {built!r}, serving {wanted!r}" for key, (built, wanted) in mismatched.items())
+        raise ArtifactError(f"{version_path} was built with different parameters ({details})")
+
+    if check_files:
+        actual = _artifact_files(version_path)
+        missing = sorted(set(artifact["files"]) - set(actual))
+        corrupt = sorted(name for name, digest in artifact["files"].items() if actual.get(name, digest) != digest)
+        if missing or corrupt:
+            raise ArtifactError(f"{version_path}: missing files {missing}, checksum mismatches {corrupt}")
+    return artifact
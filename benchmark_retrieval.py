@@ -0,0 +1,172 @@
+# benchmark_retrieval.py
+# Compare the native MMR retrieval path against langchain's max_marginal_relevance_search
+# on small_eval_set.json: end-to-end latency, MMR-step latency, precision and recall.
+# Also reports memory per million vectors and recall deltas for compressed storage
+# (float16/int8 scalar quantization, optional truncated dimensions, exact rescoring).
+#
+#   python benchmark_retrieval.py --eval-set small_eval_set.json --out benchmark_results.json
+#   python benchmark_retrieval.py --compression float16,int8,int8@256
+
+import argparse
+import json
+import time
+from typing import Dict, Any, List, Callable
+
+import numpy as np
+from langchain.vectorstores import FAISS
+from langchain_community.vectorstores.utils import maximal_marginal_relevance as langchain_mmr
+
+from rag_backend import RAGBackend, RAGConfig
+from mmr import cosine_scores, maximal_marginal_relevance
+from quantization import memory_per_million
+from shard_manager import ShardManager
+from index_versions import IndexVersion
+
+
+def merged_store(rag: RAGBackend) -> FAISS:
+    # One index over every shard, as the store was before sharding; reuses the stored vectors
+    text_embeddings, metadatas = [], []
+    for shard in rag.shards.route():
+        vectors = shard.vectors_at(np.arange(len(shard)))
+        for position, vector in enumerate(vectors):
+            doc = shard.document_at(position)
+            text_embeddings.append((doc.page_content, vector.tolist()))
+            metadatas.append(doc.metadata)
+    return FAISS.from_embeddings(text_embeddings, rag.embeddings, metadatas=metadatas)
+
+
+def legacy_retrieve(rag: RAGBackend, question: str, store: FAISS) -> List[Dict[str, Any]]:
+    # The pre-native path: one langchain MMR over a single index, then re-embed every hit to score it
+    docs = store.max_marginal_relevance_search(
+        query=question,
+        k=rag.config.RETRIEVER_K,
+        fetch_k=rag.config.RETRIEVER_FETCH_K
+    )
+    query_embedding = rag.embeddings.embed_query(question)
+    doc_embeddings = rag.embeddings.embed_documents([doc.page_content for doc in docs])
+    scores = cosine_scores(np.asarray(query_embedding), np.asarray(doc_embeddings))
+    return [{**doc.metadata, "score": float(s)} for doc, s in zip(docs, scores)]
+
+
+def native_retrieve(rag: RAGBackend, question: str) -> List[Dict[str, Any]]:
+    return [doc.metadata for doc in rag._retrieve(question)]
+
+
+def precision_recall(retrieved: List[Dict[str, Any]], relevant_codes: List[str]) -> Dict[str, float]:
+    retrieved_codes = {m.get("code") for m in retrieved if "code" in m}
+    relevant = set(relevant_codes)
+    tp = len(relevant & retrieved_codes)
+    return {
+        "precision": tp / len(retrieved_codes) if retrieved_codes else 0.0,
+        "recall": tp / len(relevant) if relevant else 0.0,
+    }
+
+
+def run_path(rag: RAGBackend, labeled_set: List[Dict[str, Any]],
+             retrieve: Callable[[RAGBackend, str], List[Dict[str, Any]]]) -> Dict[str, Any]:
+    latencies, precisions, recalls, sizes = [], [], [], []
+    for item in labeled_set:
+        start = time.perf_counter()
+        retrieved = retrieve(rag, item["query"])
+        latencies.append(time.perf_counter() - start)
+        metrics = precision_recall(retrieved, item["relevant_codes"])
+        precisions.append(metrics["precision"])
+        recalls.append(metrics["recall"])
+        sizes.append(len(retrieved))
+    return {
+        "latency_p50_s": float(np.percentile(latencies, 50)),
+        "latency_p95_s": float(np.percentile(latencies, 95)),
+        "precision": float(np.mean(precisions)),
+        "recall": float(np.mean(recalls)),
+        "avg_results": float(np.mean(sizes)),
+    }
+
+
+def mmr_step(rag: RAGBackend, labeled_set: List[Dict[str, Any]], repeats: int) -> Dict[str, float]:
+    # Time only the MMR selection on identical candidate pools
+    native, legacy = [], []
+    k, fetch_k = rag.config.RETRIEVER_K, rag.config.RETRIEVER_FETCH_K
+    for item in labeled_set:
+        query_vector = np.asarray(rag.embeddings.embed_query(item["query"]), dtype=np.float32)
+        _, vectors, _ = rag.shards.search(query_vector, fetch_k, rag.shards.route())
+        for _ in range(repeats):
+            start = time.perf_counter()
+            maximal_marginal_relevance(query_vector, vectors, k, lambda_mult=rag.config.MMR_LAMBDA)
+            native.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            langchain_mmr(query_vector, list(vectors), lambda_mult=rag.config.MMR_LAMBDA, k=k)
+            legacy.append(time.perf_counter() - start)
+    return {
+        "native_mmr_ms": float(np.mean(native) * 1000),
+        "langchain_mmr_ms": float(np.mean(legacy) * 1000),
+    }
+
+
+def compressed_index(rag: RAGBackend, quantization: str, dimensions: int) -> IndexVersion:
+    # Compressed in-memory copies of every live shard; nothing is re-embedded
+    index = rag.index
+    shards = ShardManager(index.shards.root, list(index.shards.specs.values()), rag.embeddings)
+    shards.shards = {
+        name: shard.compressed(quantization, dimensions, rag.config.RESCORE_OVERSAMPLE)
+        for name, shard in index.shards.shards.items()
+    }
+    return IndexVersion(f"{index.name}-{quantization}-{dimensions}", index.path, shards, index.prereq_graph)
+
+
+def compression_sweep(rag: RAGBackend, labeled_set: List[Dict[str, Any]], modes: List[str]) -> Dict[str, Any]:
+    full_dimensions = next(iter(rag.shards.shards.values())).store.index.d
+    baseline = run_path(rag, labeled_set, native_retrieve)
+    results: Dict[str, Any] = {"float32": {**baseline, **memory_per_million(full_dimensions)}}
+    live_index = rag.index
+    for mode in modes:
+        quantization, _, dims = mode.strip().partition("@")
+        quantization = None if quantization in ("", "float32") else quantization
+        dimensions = int(dims) if dims else None
+        rag.index = compressed_index(rag, quantization, dimensions)
+        try:
+            metrics = run_path(rag, labeled_set, native_retrieve)
+        finally:
+            rag.index = live_index
+        results[mode.strip()] = {
+            **metrics,
+            "recall_delta": metrics["recall"] - baseline["recall"],
+            "precision_delta": metrics["precision"] - baseline["precision"],
+            **memory_per_million(full_dimensions, quantization, dimensions),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark native vs langchain MMR retrieval.")
+    parser.add_argument("--eval-set", default="small_eval_set.json")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--min-gains", default="none,0.0,-0.1",
+                        help="Comma-separated MMR_MIN_GAIN values to sweep ('none' disables early stop)")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--compression", default="float16,int8,int8@256",
+                        help="Comma-separated storage modes to compare: <float16|int8|float32>[@dimensions]")
+    args = parser.parse_args()
+
+    with open(args.eval_set, "r", encoding="utf-8") as f:
+        labeled_set = json.load(f)
+
+    rag = RAGBackend()
+    store = merged_store(rag)
+    results: Dict[str, Any] = {
+        "legacy": run_path(rag, labeled_set, lambda rag, question: legacy_retrieve(rag, question, store))
+    }
+    for value in args.min_gains.split(","):
+        rag.config.MMR_MIN_GAIN = None if value.strip() == "none" else float(value)
+        results[f"native_min_gain={value.strip()}"] = run_path(rag, labeled_set, native_retrieve)
+    results["mmr_step"] = mmr_step(rag, labeled_set, args.repeats)
+    if args.compression:
+        rag.config.MMR_MIN_GAIN = RAGConfig.MMR_MIN_GAIN
+        results["compression"] = compression_sweep(rag, labeled_set, args.compression.split(","))
+
+    print(json.dumps(results, indent=4))
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
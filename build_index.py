@@ -0,0 +1,43 @@
+# build_index.py
+# Offline index build: embeds every source declared in data_manifest.json into a new
+# versioned index under database/versions/<version>/, writes artifact.json (build
+# parameters, data and file checksums) and promotes it to CURRENT. Serving processes
+# (RAG_ALLOW_INDEX_BUILD=0) only verify and load these artifacts.
+#
+#   python build_index.py --database database --manifest data_manifest.json
+#   python build_index.py --base current   # re-embed only new or changed sources
+
+import argparse
+import json
+
+from rag_backend import RAGBackend, RAGConfig
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a versioned, checksummed index artifact.")
+    parser.add_argument("--database", default=RAGConfig.DATABASE_PATH)
+    parser.add_argument("--manifest", default=RAGConfig.DATA_MANIFEST)
+    parser.add_argument("--no-promote", action="store_true", help="Build and verify without updating CURRENT")
+    parser.add_argument("--base", default=None,
+                        help="Version to copy shards from when their source file is unchanged ('current' for CURRENT)")
+    args = parser.parse_args()
+
+    RAGConfig.DATABASE_PATH = args.database
+    RAGConfig.DATA_MANIFEST = args.manifest
+    RAGConfig.ALLOW_INDEX_BUILD = True
+
+    rag = RAGBackend(load_index=False)
+    index = rag.build_artifact(promote=not args.no_promote, base=args.base)
+    summary = {
+        "version": index.name,
+        "path": index.path,
+        "promoted": not args.no_promote,
+        "built_at": index.artifact["built_at"],
+        "data": [{"path": d["path"], "sha256": d["sha256"]} for d in index.artifact["data"]],
+        "shards": {name: len(shard) for name, shard in index.shards.shards.items()},
+    }
+    print(json.dumps(summary, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from langchain.schema import Document
+
+
+# "UNIV 0090. Meditation and the Brain: Applications in Basic and"
+COURSE_HEADER_RE = re.compile(r"^([A-Z]{2,4})\s+(\d{4}[A-Z]?)\.\s+(.*)$")
+# Running page headers: "University Courses            1" / "2         University Courses"
+PAGE_HEADER_RE = re.compile(r"^\s*(\d+\s{2,}\S.*|\S.*\s{2,}\d+)\s*$")
+MINOR_WORDS = {"a", "an", "and", "as", "at", "by", "for", "in", "of", "on", "or", "the", "to", "with"}
+MAX_TITLE_LINES = 3
+MAX_HEADING_WORDS = 8
+PROSE_CHUNK_SIZE = 1500
+
+
+def _is_heading(line: str, previous: str) -> bool:
+    """Short Title Case line with no digits or terminal punctuation that starts a new block."""
+    words = line.split()
+    if not words or len(words) > MAX_HEADING_WORDS or line[-1] in ".,;:":
+        return False
+    if any(ch.isdigit() for ch in line):
+        return False
+    if previous and previous[-1] not in ".:!?)":
+        return False
+    return all(w[0].isupper() or w.lower() in MINOR_WORDS for w in words)
+
+
+class _Block:
+    def __init__(self, kind: str, page: int, heading: str, header: Tuple[str, str, str] = None):
+        self.kind = kind
+        self.page = page
+        self.heading = heading
+        self.header = header
+        self.lines: List[str] = []
+
+
+def _pages_to_lines(pages: List[Document]) -> List[Tuple[int, str]]:
+    lines: List[Tuple[int, str]] = []
+    for page in pages:
+        page_lines = [l.strip() for l in page.page_content.splitlines()]
+        page_lines = [l for l in page_lines if l]
+        # Running headers can be extracted at either end of the page
+        if page_lines and PAGE_HEADER_RE.match(page_lines[0]):
+            page_lines = page_lines[1:]
+        if page_lines and PAGE_HEADER_RE.match(page_lines[-1]):
+            page_lines = page_lines[:-1]
+        lines.extend((page.metadata.get("page", 0), l) for l in page_lines)
+    return lines
+
+
+def _split_blocks(lines: List[Tuple[int, str]]) -> List[_Block]:
+    blocks: List[_Block] = []
+    heading = ""
+    current: Optional[_Block] = None
+    previous = ""
+    i = 0
+    while i < len(lines):
+        page, line = lines[i]
+        header = COURSE_HEADER_RE.match(line)
+        if header:
+            # Titles can wrap; they end at the first line ending in a period
+            title_lines = [header.group(3)]
+            while not title_lines[-1].endswith(".") and len(title_lines) < MAX_TITLE_LINES and i + 1 < len(lines):
+                i += 1
+                title_lines.append(lines[i][1])
+            title = " ".join(title_lines).rstrip(".").strip()
+            current = _Block("course", page, heading, (header.group(1), header.group(2), title))
+            blocks.append(current)
+            previous = title_lines[-1]
+        elif _is_heading(line, previous):
+            if line != heading:
+                heading = line
+                current = None
+            previous = line
+        else:
+            if current is None:
+                current = _Block("prose", page, heading)
+                blocks.append(current)
+            current.lines.append(line)
+            previous = line
+        i += 1
+    return blocks
+
+
+def _chunk_prose(text: str, size: int) -> List[str]:
+    # Split on line boundaries without overlap so nothing is indexed twice
+    chunks: List[str] = []
+    current: List[str] = []
+    length = 0
+    for line in text.splitlines():
+        if current and length + len(line) > size:
+            chunks.append("\n".join(current))
+            current, length = [], 0
+        current.append(line)
+        length += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def chunk_bulletin(pages: List[Document], source: str, prose_chunk_size: int = PROSE_CHUNK_SIZE) -> List[Document]:
+    """
+    Split bulletin PDF pages into one document per course entry (with parsed
+    department, code and title metadata, ``doc_type="course"``) and section-grouped
+    prose chunks (``doc_type="prose"``, ``section`` metadata).
+    """
+    documents: List[Document] = []
+    for block in _split_blocks(_pages_to_lines(pages)):
+        base: Dict[str, Any] = {"source": source, "page": block.page, "section": block.heading}
+        if block.kind == "course":
+            department, code, title = block.header
+            documents.append(Document(
+                page_content=(
+                    f"Title: {title}\n"
+                    f"Code: {code}\n"
+                    f"Department: {department}\n"
+                    f"Section: {block.heading}\n"
+                    f"Description:\n{' '.join(block.lines)}"
+                ),
+                metadata={**base, "doc_type": "course", "title": title, "code": code, "department": department}
+            ))
+        else:
+            for chunk in _chunk_prose("\n".join(block.lines), prose_chunk_size):
+                heading = f"{block.heading}\n" if block.heading else ""
+                documents.append(Document(
+                    page_content=heading + chunk,
+                    metadata={**base, "doc_type": "prose"}
+                ))
+    return documents
@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from typing import Any, Callable
+
+
+class DeadlineExceeded(TimeoutError):
+    """A request (or one of its stages) ran out of its latency budget."""
+
+
+class Deadline:
+    """Latency budget for one request; stages take what they need from what is left."""
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget_s
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def stage(self, stage_s: float = None) -> float:
+        """Budget for the next stage: its own cap, clipped to what remains of the request."""
+        remaining = self.remaining()
+        return remaining if stage_s is None else min(stage_s, remaining)
+
+
+def call_with_timeout(executor: Executor, fn: Callable[[], Any], timeout: float, stage: str) -> Any:
+    """
+    Run ``fn`` on ``executor`` and wait at most ``timeout`` seconds. The call
+    itself cannot be interrupted; on timeout it finishes in the background and
+    its result is dropped.
+    """
+    if timeout <= 0:
+        raise DeadlineExceeded(f"No time left for {stage}")
+    future = executor.submit(fn)
+    done, _ = wait([future], timeout=timeout)
+    if not done:
+        future.cancel()
+        raise DeadlineExceeded(f"{stage} timed out after {timeout:.2f}s")
+    return future.result()
+
+
+def hedged_call(executor: Executor, fn: Callable[[], Any], timeout: float, stage: str,
+                hedge_after: float = None, max_attempts: int = 1) -> Any:
+    """
+    Like call_with_timeout, but if ``fn`` has not returned after ``hedge_after``
+    seconds (or fails), start another attempt, up to ``max_attempts`` in total,
+    and return the first one to succeed. Cuts tail latency for idempotent calls
+    such as query embeddings.
+    """
+    if timeout <= 0:
+        raise DeadlineExceeded(f"No time left for {stage}")
+    expires_at = time.monotonic() + timeout
+    pending = {executor.submit(fn)}
+    attempts = 1
+    error: BaseException = None
+    while pending:
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            break
+        can_hedge = attempts < max_attempts
+        wait_for = min(remaining, hedge_after) if can_hedge and hedge_after is not None else remaining
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            error = future.exception()
+        # Hedge when the attempt is slow, retry straight away when it failed
+        if can_hedge and (not done or not pending):
+            pending.add(executor.submit(fn))
+            attempts += 1
+    if error is not None and not pending:
+        raise error
+    for future in pending:
+        future.cancel()
+    raise DeadlineExceeded(f"{stage} timed out after {timeout:.2f}s ({attempts} attempts)") from error
@@ -0,0 +1,96 @@
+import os
+import time
+import shutil
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from shard_manager import ShardManager
+from prereq_graph import PrerequisiteGraph
+
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+
+class IndexVersion:
+    """Everything one query reads: the shards and the prerequisite graph of a single build."""
+
+    def __init__(self, name: str, path: str, shards: ShardManager, prereq_graph: PrerequisiteGraph,
+                 artifact: Dict[str, Any] = None):
+        self.name = name
+        self.path = path
+        self.shards = shards
+        self.prereq_graph = prereq_graph
+        self.artifact = artifact
+        self.loaded_at = time.time()
+
+
+class IndexVersionStore:
+    """
+    On-disk layout for versioned indexes::
+
+        <root>/versions/<version>/shards/<shard>/index.faiss
+        <root>/versions/<version>/prereq_graph.npz
+        <root>/versions/<version>/artifact.json   # build parameters and checksums
+        <root>/CURRENT            # name of the version to serve
+
+    A version directory is only ever written before it is promoted, and
+    ``CURRENT`` is replaced with an atomic rename, so a reader never sees a
+    partially built index.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.versions_root = os.path.join(root, VERSIONS_DIR)
+
+    def version_path(self, name: str) -> str:
+        return os.path.join(self.versions_root, name)
+
+    def current(self) -> Optional[str]:
+        pointer = os.path.join(self.root, CURRENT_FILE)
+        if not os.path.exists(pointer):
+            return None
+        with open(pointer, "r", encoding="utf-8") as f:
+            name = f.read().strip()
+        return name if name and os.path.isdir(self.version_path(name)) else None
+
+    def versions(self) -> List[str]:
+        if not os.path.isdir(self.versions_root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.versions_root)
+            if os.path.isdir(self.version_path(name)) and not name.endswith(".tmp")
+        )
+
+    def create(self) -> Tuple[str, str]:
+        """Reserve a new, empty version directory named after the build time."""
+        base = time.strftime("%Y%m%d-%H%M%S")
+        name, suffix = base, 1
+        while os.path.exists(self.version_path(name)):
+            suffix += 1
+            name = f"{base}-{suffix}"
+        path = self.version_path(name)
+        os.makedirs(path)
+        return name, path
+
+    def promote(self, name: str) -> None:
+        pointer = os.path.join(self.root, CURRENT_FILE)
+        tmp_pointer = f"{pointer}.tmp"
+        with open(tmp_pointer, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(tmp_pointer, pointer)
+        logging.info(f"Index version {name} promoted to current.")
+
+    def discard(self, name: str) -> None:
+        shutil.rmtree(self.version_path(name), ignore_errors=True)
+
+    def prune(self, keep: List[str]) -> None:
+        """
+        Delete version directories older than everything in ``keep``. Newer
+        directories are left alone: another worker may still be building them.
+        """
+        oldest_kept = min(keep)
+        for name in self.versions():
+            if name < oldest_kept:
+                logging.info(f"Removing old index version {name}.")
+                self.discard(name)
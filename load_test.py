@@ -0,0 +1,252 @@
+# load_test.py
+# Measure how much concurrent /query traffic one main.py worker sustains, without
+# calling Gemini: the API runs in a subprocess with fake embedding and LLM providers
+# (configurable latency), and an open-loop generator sends small_eval_set.json queries
+# at increasing arrival rates. Reports throughput, latency percentiles and error rates.
+#
+#   python load_test.py --rates 2,5,10,20 --duration 30 --llm-latency-ms 1500 --threadpool 40
+#
+# The fake index is built once (with fake embeddings, no API calls) under
+# database_loadtest/ and reused on later runs.
+
+import argparse
+import hashlib
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+import numpy as np
+import requests
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_DIMENSIONS = 768
+
+
+def _sleep_latency(mean_ms: float, jitter: float) -> None:
+    # Log-normal around the mean: most calls close to it, a long tail above
+    if mean_ms > 0:
+        time.sleep(mean_ms / 1000 * random.lognormvariate(-jitter ** 2 / 2, jitter))
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic pseudo-random vectors per text; only query embedding is slowed down."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    @staticmethod
+    def _vector(text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSIONS).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        _sleep_latency(self.latency_ms, self.jitter)
+        if random.random() < self.error_rate:
+            raise RuntimeError("Fake embedding error")
+        return self._vector(text)
+
+
+class _FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeLLM:
+    """Sleeps for the configured latency and returns a fixed-size answer."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def invoke(self, prompt: str) -> _FakeMessage:
+        _sleep_latency(self.latency_ms, self.jitter)
+        if random.random() < self.error_rate:
+            raise RuntimeError("Fake LLM error")
+        return _FakeMessage(f"Fake answer ({len(prompt)} prompt characters).")
+
+
+# ---------- server ----------
+
+def serve(args: argparse.Namespace) -> None:
+    """Run main.app in this process with fake providers, a separate index and a sized threadpool."""
+    import uvicorn
+    from rag_backend import RAGBackend, RAGConfig
+
+    RAGConfig.DATABASE_PATH = args.database
+    # main.py sizes anyio's threadpool for sync endpoints (and the backend its upstream pools) from this
+    RAGConfig.REQUEST_THREADS = args.threadpool
+    RAGBackend._initialize_embeddings = lambda self: FakeEmbeddings(
+        args.embed_latency_ms, args.jitter, args.embed_error_rate
+    )
+    RAGBackend._initialize_llm = lambda self: FakeLLM(args.llm_latency_ms, args.jitter, args.llm_error_rate)
+    import main
+
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def start_server(args: argparse.Namespace) -> subprocess.Popen:
+    command = [
+        sys.executable, __file__, "--serve",
+        "--port", str(args.port),
+        "--database", args.database,
+        "--threadpool", str(args.threadpool),
+        "--embed-latency-ms", str(args.embed_latency_ms),
+        "--llm-latency-ms", str(args.llm_latency_ms),
+        "--jitter", str(args.jitter),
+        "--embed-error-rate", str(args.embed_error_rate),
+        "--llm-error-rate", str(args.llm_error_rate),
+    ]
+    server = subprocess.Popen(command)
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode} during startup")
+        try:
+            requests.get(f"http://127.0.0.1:{args.port}/docs", timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(1)
+    server.terminate()
+    raise RuntimeError(f"Server did not start within {args.startup_timeout}s")
+
+
+# ---------- load generator ----------
+
+def run_level(args: argparse.Namespace, queries: List[str], rate: float) -> Dict[str, Any]:
+    """
+    Open loop: requests are sent at Poisson arrival times regardless of how many
+    are still in flight, and latency is measured from the scheduled send time so
+    queueing on the client side is not hidden.
+    """
+    url = f"http://127.0.0.1:{args.port}{args.endpoint}"
+    rng = random.Random(args.seed)
+    local = threading.local()
+    results: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    in_flight = [0, 0]  # current, max
+
+    def send(payload: Dict[str, Any], scheduled_at: float) -> None:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        outcome: Dict[str, Any] = {"ok": False, "degraded": False}
+        try:
+            response = session.post(url, json=payload, auth=(args.username, args.password),
+                                    timeout=args.request_timeout)
+            outcome["status"] = response.status_code
+            outcome["ok"] = response.status_code == 200
+            if outcome["ok"]:
+                outcome["degraded"] = "degraded" in response.json()
+        except requests.RequestException as e:
+            outcome["status"] = type(e).__name__
+        outcome["latency"] = time.perf_counter() - scheduled_at
+        with lock:
+            in_flight[0] -= 1
+            results.append(outcome)
+
+    start = time.perf_counter()
+    scheduled_at = start
+    sent = 0
+    with ThreadPoolExecutor(max_workers=args.max_in_flight) as executor:
+        while True:
+            scheduled_at += rng.expovariate(rate)
+            if scheduled_at - start > args.duration:
+                break
+            time.sleep(max(0.0, scheduled_at - time.perf_counter()))
+            question = rng.choice(queries)
+            if args.distinct:
+                question = f"{question} (request {sent})"  # defeats request coalescing
+            executor.submit(send, {"question": question}, scheduled_at)
+            sent += 1
+    # Includes draining the requests still in flight when sending stopped
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([r["latency"] for r in results if r["ok"]])
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    ok = len(latencies)
+    return {
+        "offered_rps": rate,
+        "sent": sent,
+        "throughput_rps": ok / elapsed if elapsed else 0.0,
+        "error_rate": 1 - ok / len(results) if results else 0.0,
+        "degraded_rate": sum(r["degraded"] for r in results) / ok if ok else 0.0,
+        "latency_p50_s": float(np.percentile(latencies, 50)) if ok else None,
+        "latency_p90_s": float(np.percentile(latencies, 90)) if ok else None,
+        "latency_p99_s": float(np.percentile(latencies, 99)) if ok else None,
+        "max_in_flight": in_flight[1],
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test of the FastAPI service with fake model backends.")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--eval-set", default="small_eval_set.json")
+    parser.add_argument("--out", default="load_test_results.json")
+    parser.add_argument("--endpoint", default="/query", choices=["/query", "/retrieve"])
+    parser.add_argument("--rates", default="1,2,5,10,20", help="Comma-separated arrival rates (requests/s) to step through")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per rate level")
+    parser.add_argument("--distinct", action="store_true", help="Make every question unique so none are coalesced")
+    parser.add_argument("--max-in-flight", type=int, default=512, help="Client-side cap on outstanding requests")
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--database", default="database_loadtest", help="Index directory built with fake embeddings")
+    parser.add_argument("--threadpool", type=int, default=40, help="Server threads for sync endpoints")
+    parser.add_argument("--startup-timeout", type=float, default=900.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=80.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--jitter", type=float, default=0.3, help="Log-normal sigma of fake latencies")
+    parser.add_argument("--embed-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--username", default="user")
+    parser.add_argument("--password", default="pass")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    with open(args.eval_set, "r", encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)]
+
+    server = start_server(args)
+    try:
+        levels = []
+        for rate in (float(r) for r in args.rates.split(",")):
+            level = run_level(args, queries, rate)
+            levels.append(level)
+            p99 = level["latency_p99_s"]
+            print(f"{rate:>7.1f} rps offered | {level['throughput_rps']:7.2f} rps ok | "
+                  f"p50 {level['latency_p50_s'] or 0:6.2f}s p99 {p99 or 0:6.2f}s | "
+                  f"errors {level['error_rate']:.1%} degraded {level['degraded_rate']:.1%} | "
+                  f"max in flight {level['max_in_flight']}")
+    finally:
+        server.terminate()
+        server.wait()
+
+    results = {"config": {k: v for k, v in vars(args).items() if k != "password"}, "levels": levels}
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+    print(f"Results saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,25 @@
 # main.py (separate file for FastAPI app)
 
+import os
+import secrets
+import anyio
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from pydantic import BaseModel
-from typing import Dict, Any, List
+from brotli_asgi import BrotliMiddleware
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, Any, List, Optional
 from fastapi import Query
 
 
 # Assuming the updated code above is in a file named rag.py
 from rag_backend import RAGBackend
+from deadlines import Deadline, DeadlineExceeded
 
-app = FastAPI(title="RAG Course Assistant API")
+app = FastAPI(title="RAG Course Assistant API", default_response_class=ORJSONResponse)
+
+# br for clients that accept it, gzip otherwise; small bodies are sent as-is
+app.add_middleware(BrotliMiddleware, quality=4, minimum_size=1000, gzip_fallback=True)
 
 security = HTTPBasic()
 
@@ -18,8 +27,14 @@ security = HTTPBasic()
 VALID_USERNAME = "user"
 VALID_PASSWORD = "pass"
 
+def _credentials_match(credentials: HTTPBasicCredentials, username: str, password: str) -> bool:
+    # Constant-time comparisons, both always evaluated, so timing reveals neither field
+    username_ok = secrets.compare_digest(credentials.username.encode("utf-8"), username.encode("utf-8"))
+    password_ok = secrets.compare_digest(credentials.password.encode("utf-8"), password.encode("utf-8"))
+    return username_ok and password_ok
+
 def verify_credentials(credentials: HTTPBasicCredentials = Depends(security)):
-    if credentials.username != VALID_USERNAME or credentials.password != VALID_PASSWORD:
+    if not _credentials_match(credentials, VALID_USERNAME, VALID_PASSWORD):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
@@ -27,15 +42,155 @@ def verify_credentials(credentials: HTTPBasicCredentials = Depends(security)):
         )
     return credentials
 
+# Admin credentials for index management endpoints; without both, /admin/* is disabled
+ADMIN_USERNAME = os.getenv("RAG_ADMIN_USERNAME")
+ADMIN_PASSWORD = os.getenv("RAG_ADMIN_PASSWORD")
+
+def verify_admin_credentials(credentials: HTTPBasicCredentials = Depends(security)):
+    if not (ADMIN_USERNAME and ADMIN_PASSWORD):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Admin endpoints are disabled; set RAG_ADMIN_USERNAME and RAG_ADMIN_PASSWORD to enable them",
+        )
+    if not _credentials_match(credentials, ADMIN_USERNAME, ADMIN_PASSWORD):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid admin credentials",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return credentials
+
 rag = RAGBackend()
 
+
+@app.on_event("startup")
+async def size_threadpool():
+    # Sync endpoints run on anyio's threadpool; the backend sizes its upstream pools to match
+    anyio.to_thread.current_default_thread_limiter().total_tokens = rag.config.REQUEST_THREADS
+
+
+async def request_deadline() -> Deadline:
+    # Async, so it runs on the event loop as the request arrives: time queued for a thread counts
+    return Deadline(rag.config.REQUEST_DEADLINE_S)
+
+
+def _description(course: Dict[str, Any]) -> str:
+    return course.get("content", "").split("Description:")[-1].strip()
+
+# Derived fields that can be requested like metadata fields
+COMPUTED_FIELDS = {"description": _description}
+
+# Metadata keys of retrieved courses (Brown sections, LSU catalog entries, bulletin course entries)
+COURSE_FIELDS = {
+    "title", "code", "department", "professor", "time", "source", "score", "content",
+    "doc_type", "page", "section", "Dept", "Num", "Name", "Reqs", "university_name",
+} | set(COMPUTED_FIELDS)
+
+
 class QueryRequest(BaseModel):
     question: str
+    meeting_filter: Optional[str] = None
+    avoid_schedule: Optional[List[str]] = None
+    doc_types: Optional[List[str]] = None
+    universities: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+    # Follow-up questions with the same session_id refine the previous results
+    session_id: Optional[str] = Field(None, max_length=128)
+    # Response shaping: course fields to return (e.g. ["code", "title"]) and a page of retrieved_courses
+    fields: Optional[List[str]] = None
+    page: int = Field(1, ge=1)
+    page_size: Optional[int] = Field(None, ge=1, le=100)
+    # The prerequisite-graph lists; by default left out when specific fields are requested
+    include_prerequisite_graph: Optional[bool] = None
+
+    @field_validator("fields")
+    @classmethod
+    def known_fields(cls, fields: Optional[List[str]]) -> Optional[List[str]]:
+        unknown = [field for field in fields or [] if field not in COURSE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(sorted(COURSE_FIELDS))}")
+        return fields
+
+
+def shape_response(result: Dict[str, Any], request: QueryRequest) -> ORJSONResponse:
+    """
+    Page and trim ``retrieved_courses`` as the request asks (dropping the
+    prerequisite graph unless it is wanted), then serialize with orjson
+    directly (skipping FastAPI's response_model re-encoding).
+    """
+    courses = result["retrieved_courses"]
+    total = len(courses)
+    if request.page_size:
+        start = (request.page - 1) * request.page_size
+        courses = courses[start:start + request.page_size]
+    if request.fields:
+        courses = [
+            {
+                field: COMPUTED_FIELDS[field](course) if field in COMPUTED_FIELDS else course.get(field)
+                for field in request.fields
+            }
+            for course in courses
+        ]
+    body = {**result, "retrieved_courses": courses, "total_courses": total}
+    include_graph = request.include_prerequisite_graph
+    if include_graph is False or (include_graph is None and request.fields):
+        body.pop("prerequisite_graph", None)
+    if request.page_size:
+        body.update(page=request.page, page_size=request.page_size)
+    return ORJSONResponse(body)
 
 @app.post("/query", response_model=Dict[str, Any])
-def query_endpoint(request: QueryRequest, auth: HTTPBasicCredentials = Depends(verify_credentials)):
-    result = rag.get_response(request.question)
-    return result
+def query_endpoint(request: QueryRequest, deadline: Deadline = Depends(request_deadline),
+                   auth: HTTPBasicCredentials = Depends(verify_credentials)):
+    # A slow LLM degrades to a template answer ("degraded" in the body); only a failed search is an error
+    if request.page_size and request.page > 1:
+        # The answer comes with page 1; later pages only need the ranked courses
+        return retrieve_endpoint(request, deadline, auth)
+    try:
+        result = rag.get_response(
+            request.question,
+            meeting_filter=request.meeting_filter,
+            avoid_schedule=request.avoid_schedule,
+            doc_types=request.doc_types,
+            universities=request.universities,
+            sources=request.sources,
+            session_id=request.session_id,
+            deadline=deadline
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    return shape_response(result, request)
+
+
+
+@app.post("/retrieve", response_model=Dict[str, Any])
+def retrieve_endpoint(request: QueryRequest, deadline: Deadline = Depends(request_deadline),
+                      auth: HTTPBasicCredentials = Depends(verify_credentials)):
+    # Ranked courses without LLM generation
+    try:
+        result = rag.retrieve(
+            request.question,
+            meeting_filter=request.meeting_filter,
+            avoid_schedule=request.avoid_schedule,
+            doc_types=request.doc_types,
+            universities=request.universities,
+            sources=request.sources,
+            session_id=request.session_id,
+            deadline=deadline
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    response = {"retrieved_courses": result["retrieved_courses"]}
+    if result["prerequisite_graph"]:
+        response["prerequisite_graph"] = result["prerequisite_graph"]
+    if "session" in result:
+        response["session"] = result["session"]
+    return shape_response(response, request)
+
+
+@app.delete("/session/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+def end_session_endpoint(session_id: str, auth: HTTPBasicCredentials = Depends(verify_credentials)):
+    rag.end_session(session_id)
 
 
 @app.get("/evaluate", 
@@ -48,3 +203,31 @@ def evaluate_endpoint(
     
     results = rag.evaluate(labeled_set_file=labeled_set_file)
     return results
+
+
+class RebuildRequest(BaseModel):
+    shards: Optional[List[str]] = None
+
+@app.post("/admin/rebuild", status_code=status.HTTP_202_ACCEPTED, response_model=Dict[str, Any])
+def rebuild_endpoint(request: RebuildRequest, auth: HTTPBasicCredentials = Depends(verify_admin_credentials)):
+    # Builds a new index version in the background; queries keep using the live one until the swap
+    try:
+        return rag.start_rebuild(request.shards)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@app.post("/admin/rollback", response_model=Dict[str, Any])
+def rollback_endpoint(auth: HTTPBasicCredentials = Depends(verify_admin_credentials)):
+    try:
+        rag.rollback_index()
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return rag.index_status()
+
+
+@app.get("/admin/index", response_model=Dict[str, Any])
+def index_status_endpoint(auth: HTTPBasicCredentials = Depends(verify_admin_credentials)):
+    return rag.index_status()
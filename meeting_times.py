@@ -0,0 +1,201 @@
+import os
+import re
+import logging
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+import numpy as np
+
+
+DAYS = ["M", "T", "W", "Th", "F", "Sa", "Su"]
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+MASK_WORDS = (len(DAYS) * SLOTS_PER_DAY + 63) // 64
+
+PARTS_OF_DAY = {
+    "morning": (0, 12 * 60),
+    "afternoon": (12 * 60, 18 * 60),
+    "evening": (17 * 60, 24 * 60),
+}
+
+DAY_TOKEN_RE = re.compile(r"Th|Tu|Sa|Su|M|T|W|F")
+DAY_PATTERN_RE = re.compile(r"\b((?:Th|Tu|Sa|Su|M|T|W|F)+)\b")
+TIME_RANGE_RE = re.compile(
+    r"(\d{1,2})(?::(\d{2}))?\s*([ap])?m?\s*-\s*(\d{1,2})(?::(\d{2}))?\s*([ap])m?", re.IGNORECASE
+)
+DAY_NAME_RE = re.compile(r"\b(mon|tues|wednes|thurs|fri|satur|sun)days?\b", re.IGNORECASE)
+DAY_NAMES = ["mon", "tues", "wednes", "thurs", "fri", "satur", "sun"]
+MEETING_RE = re.compile(r"((?:Th|Tu|Sa|Su|M|T|W|F)+)\s+(\S+-\S+)")
+# In questions a bare day letter is often an initial ("F. Hamlin", "W. E. B. Du Bois"): only
+# "on MWF" or a pattern right before a time range or part of day ("TTh 1-2:30p", "W evenings")
+# counts as days there
+QUESTION_DAYS_RE = re.compile(
+    r"\bon\s+((?:Th|Tu|Sa|Su|M|T|W|F)+)\b(?![.'])"
+    r"|\b((?:Th|Tu|Sa|Su|M|T|W|F)+)\s+(?=\d{1,2}(?::\d{2})?\s*(?:[ap]m?)?\s*-|(?i:morning|afternoon|evening))"
+)
+
+
+def _minutes(hour: str, minute: str, meridiem: str) -> int:
+    h = int(hour) % 12
+    if meridiem.lower() == "p":
+        h += 12
+    return h * 60 + int(minute or 0)
+
+
+def _parse_days(pattern: str) -> List[int]:
+    return [DAYS.index("T" if d == "Tu" else d) for d in DAY_TOKEN_RE.findall(pattern)]
+
+
+def _parse_time_range(text: str) -> Optional[Tuple[int, int]]:
+    """'10-10:50a' -> (600, 650); the start inherits the end's a/p unless that puts it after the end."""
+    m = TIME_RANGE_RE.search(text)
+    if not m:
+        return None
+    sh, sm, sp, eh, em, ep = m.groups()
+    end = _minutes(eh, em, ep)
+    start = _minutes(sh, sm, sp or ep)
+    if not sp and start > end:
+        start -= 12 * 60
+    if end <= start:
+        return None
+    return start, end
+
+
+def _set_slots(bits: np.ndarray, days: Iterable[int], start: int, end: int) -> None:
+    first = start // SLOT_MINUTES
+    last = -(-end // SLOT_MINUTES)
+    for day in days:
+        bits[day * SLOTS_PER_DAY + first:day * SLOTS_PER_DAY + last] = True
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    return np.packbits(bits).view(np.uint64)
+
+
+def _empty_bits() -> np.ndarray:
+    return np.zeros(MASK_WORDS * 64, dtype=bool)
+
+
+def parse_meeting_time(time_str: str) -> np.ndarray:
+    """
+    Parse a Brown meeting string ("MWF 10-10:50a", "MW 9-9:50a; TTh 9-10:20a")
+    into a weekly bitmask of 5-minute slots. Unparseable strings ("TBA") give an
+    all-zero mask.
+    """
+    bits = _empty_bits()
+    for days, time_range in MEETING_RE.findall(time_str or ""):
+        parsed = _parse_time_range(time_range)
+        if parsed:
+            _set_slots(bits, _parse_days(days), *parsed)
+    return _pack(bits)
+
+
+def _window(days: List[int], text: str) -> Optional[np.ndarray]:
+    ranges = [r for r in (_parse_time_range(part) for part in text.split(",")) if r]
+    lowered = text.lower()
+    ranges += [span for part, span in PARTS_OF_DAY.items() if part in lowered]
+    if not days and not ranges:
+        return None
+
+    bits = _empty_bits()
+    for start, end in ranges or [(0, 24 * 60)]:
+        _set_slots(bits, days or range(len(DAYS)), start, end)
+    return _pack(bits)
+
+
+def _day_names(text: str) -> set:
+    return {DAY_NAMES.index(name.lower()) for name in DAY_NAME_RE.findall(text)}
+
+
+def parse_time_window(text: str) -> Optional[np.ndarray]:
+    """
+    Parse a free-form availability filter into a weekly window mask, e.g.
+    "TTh afternoons", "MWF", "M 9a-12p", "W evening", "Tuesdays". Days default to the whole
+    week and times to the whole day. Returns None when nothing is recognised.
+    """
+    text = (text or "").strip()
+    days = {d for pattern in DAY_PATTERN_RE.findall(text) for d in _parse_days(pattern)}
+    return _window(sorted(days | _day_names(text)), text)
+
+
+def parse_question_window(question: str) -> Optional[np.ndarray]:
+    """
+    Like parse_time_window, for day/time constraints inside a question ("only
+    ones on Tuesday", "which meet MW 1-2:30p"). Day letters count only after
+    "on" or right before a time range, so initials in names are not read as days.
+    """
+    question = (question or "").strip()
+    days = {d for match in QUESTION_DAYS_RE.findall(question) for pattern in match if pattern
+            for d in _parse_days(pattern)}
+    return _window(sorted(days | _day_names(question)), question)
+
+
+def meeting_key(metadata: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+    """Sections are identified by term file, department and code."""
+    if "time" not in metadata or not metadata.get("code"):
+        return None
+    return metadata.get("source", ""), metadata.get("department", ""), metadata["code"]
+
+
+class MeetingTimeIndex:
+    """
+    Per-section weekly meeting bitmasks as an (n_sections x MASK_WORDS) uint64
+    matrix, so availability and conflict checks run as one vectorized bitwise
+    operation over every section.
+    """
+
+    def __init__(self, keys: List[Tuple[str, str, str]], masks: np.ndarray):
+        self.keys = list(keys)
+        self.masks = masks
+        self.scheduled = masks.any(axis=1)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def from_metadata(cls, metadatas: Iterable[Dict[str, Any]]) -> "MeetingTimeIndex":
+        keys: List[Tuple[str, str, str]] = []
+        masks: List[np.ndarray] = []
+        seen = set()
+        for metadata in metadatas:
+            key = meeting_key(metadata)
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            keys.append(key)
+            masks.append(parse_meeting_time(metadata["time"]))
+        matrix = np.vstack(masks) if masks else np.zeros((0, MASK_WORDS), dtype=np.uint64)
+        index = cls(keys, matrix)
+        logging.info(f"Built meeting-time index for {len(index)} sections ({int(index.scheduled.sum())} scheduled).")
+        return index
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, keys=np.array(self.keys, dtype=str).reshape(-1, 3), masks=self.masks)
+
+    @classmethod
+    def load(cls, path: str) -> "MeetingTimeIndex":
+        with np.load(path) as data:
+            return cls([tuple(k) for k in data["keys"].tolist()], data["masks"])
+
+    def within(self, window: np.ndarray) -> np.ndarray:
+        """Sections that meet and whose every meeting falls inside ``window``."""
+        return self.scheduled & ~np.any(self.masks & ~window, axis=1)
+
+    def overlapping(self, window: np.ndarray) -> np.ndarray:
+        """Sections with at least one meeting slot inside ``window``."""
+        return np.any(self.masks & window, axis=1)
+
+    def without_conflict(self, schedule: np.ndarray) -> np.ndarray:
+        """Scheduled sections that do not overlap ``schedule``."""
+        return self.scheduled & ~self.overlapping(schedule)
+
+    def keys_where(self, selected: np.ndarray) -> set:
+        return {self.keys[i] for i in np.flatnonzero(selected)}
+
+
+def schedule_mask(meeting_times: Iterable[str]) -> np.ndarray:
+    """Union of several meeting strings, e.g. a student's current schedule."""
+    mask = np.zeros(MASK_WORDS, dtype=np.uint64)
+    for time_str in meeting_times:
+        mask |= parse_meeting_time(time_str)
+    return mask
@@ -0,0 +1,75 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def cosine_scores(query_vector: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every candidate row against the query, in one matrix-vector product."""
+    if len(candidates) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return normalize_rows(candidates) @ normalize_rows(query_vector)
+
+
+def adaptive_fetch_k(scores: np.ndarray, k: int, min_fetch_k: int, max_fetch_k: int, margin: float) -> int:
+    """
+    Size the MMR candidate pool to the query's score distribution: keep every
+    candidate within ``margin`` of the best score, clamped to
+    [max(k, min_fetch_k), max_fetch_k]. A flat distribution (many near-ties)
+    gets a large pool, a sharp drop-off a small one.
+    """
+    if len(scores) == 0:
+        return 0
+    close = int(np.count_nonzero(scores >= scores.max() - margin))
+    fetch_k = min(max(close, k, min_fetch_k), max_fetch_k)
+    return min(fetch_k, len(scores))
+
+
+def maximal_marginal_relevance(
+    query_vector: np.ndarray,
+    candidates: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+    min_gain: float = None,
+    min_k: int = 1,
+) -> Tuple[List[int], np.ndarray]:
+    """
+    Greedy MMR over a candidate matrix.
+
+    Pairwise candidate similarities come from a single ``C @ C.T`` BLAS call;
+    each step then only updates a running max-similarity vector. Selection stops
+    at ``k`` or, once ``min_k`` items are chosen, when the best marginal score
+    drops below ``min_gain``. Returns the selected row indices in order and the
+    relevance (cosine) score of every candidate.
+    """
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return [], np.zeros(0, dtype=np.float32)
+
+    normalized = normalize_rows(candidates)
+    relevance = normalized @ normalize_rows(query_vector)
+    pairwise = normalized @ normalized.T
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    max_similarity = pairwise[first].copy()
+    available = np.ones(n, dtype=bool)
+    available[first] = False
+
+    while len(selected) < min(k, n):
+        marginal = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        marginal[~available] = -np.inf
+        best = int(np.argmax(marginal))
+        if min_gain is not None and len(selected) >= min_k and marginal[best] < min_gain:
+            break
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, pairwise[best], out=max_similarity)
+
+    return selected, relevance
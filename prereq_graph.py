@@ -0,0 +1,329 @@
+import os
+import re
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+import numpy as np
+
+
+LSU_SCHOOL = "LSU"
+BROWN_SCHOOL = "Brown"
+
+# "MATH 1550", "APMA 2570A", or a bare "0470" that inherits the previous department
+COURSE_TOKEN_RE = re.compile(r"\b(?:([A-Z]{2,4})\s+)?(\d{4}[A-Z]?)\b")
+BROWN_PREREQ_RE = re.compile(r"[Pp]rerequisites?\s*[:—-]?\s*([^.]*)")
+# Requirement clauses are ANDed; within a clause, codes joined by "or" (or a
+# comma list ending in "or") are alternatives
+REQUIREMENT_CLAUSE_SPLIT_RE = re.compile(r";|\band\b", re.IGNORECASE)
+# Grade wording ('grade of "C" or better') is not an alternative between courses
+GRADE_PHRASE_RE = re.compile(r"\bor\s+(?:above|better|higher)\b", re.IGNORECASE)
+# Text between two course tokens of the same list: commas, brackets and "or"
+LIST_GAP_RE = re.compile(r"^(?:[\s,()]|\bor\b)*$", re.IGNORECASE)
+ALTERNATIVE_RE = re.compile(r"\bor\b", re.IGNORECASE)
+
+
+def extract_course_codes(text: str) -> List[str]:
+    """
+    Extract "DEPT NUM" codes from free text, e.g.
+    'grade of "C" or above in ACCT 2101; MATH 1431' -> ['ACCT 2101', 'MATH 1431'].
+    Bare numbers ("BIOL 0280 or 0470") reuse the last department seen.
+    """
+    codes: List[str] = []
+    last_dept = None
+    for dept, num in COURSE_TOKEN_RE.findall(text or ""):
+        if dept:
+            last_dept = dept
+        if not last_dept:
+            continue
+        code = f"{last_dept} {num}"
+        if code not in codes:
+            codes.append(code)
+    return codes
+
+
+def extract_requirement_groups(text: str) -> List[List[str]]:
+    """
+    Split a requirement text into groups that must all be met, each satisfied
+    by any one of its codes, e.g.
+    'BIOL 1001 or BIOL 1201; and CHEM 2060' -> [['BIOL 1001', 'BIOL 1201'], ['CHEM 2060']].
+    Codes listed without "or" between them ('grade of "C" or better in MATH 1550,
+    MATH 1552') are each required.
+    """
+    groups: List[List[str]] = []
+    seen = set()
+    last_dept = None
+    for clause in REQUIREMENT_CLAUSE_SPLIT_RE.split(GRADE_PHRASE_RE.sub(" ", text or "")):
+        # Runs of adjacent course tokens; a run is alternatives if any gap in it says "or"
+        runs: List[Tuple[List[str], bool]] = []
+        previous_end = None
+        for match in COURSE_TOKEN_RE.finditer(clause):
+            dept, num = match.groups()
+            if dept:
+                last_dept = dept
+            gap = clause[previous_end:match.start()] if previous_end is not None else None
+            previous_end = match.end()
+            code = f"{last_dept} {num}" if last_dept else None
+            if gap is not None and LIST_GAP_RE.match(gap) and runs:
+                codes, alternative = runs[-1]
+                runs[-1] = (codes, alternative or bool(ALTERNATIVE_RE.search(gap)))
+            else:
+                runs.append(([], False))
+            if code and code not in seen:
+                seen.add(code)
+                runs[-1][0].append(code)
+        for codes, alternative in runs:
+            if not codes:
+                continue
+            if alternative:
+                groups.append(codes)
+            else:
+                groups.extend([code] for code in codes)
+    return groups
+
+
+def course_key(metadata: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """Map a document's metadata to its (school, "DEPT NUM") graph key."""
+    if metadata.get("Dept") and metadata.get("Num"):
+        return LSU_SCHOOL, f"{metadata['Dept']} {metadata['Num']}"
+    if metadata.get("department") and metadata.get("code"):
+        return BROWN_SCHOOL, f"{metadata['department']} {metadata['code']}"
+    return None
+
+
+def _to_csr(n: int, edges: Dict[int, Dict[int, int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # edges[i] maps each target to a per-edge value (the requirement group)
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    for i in range(n):
+        indptr[i + 1] = indptr[i] + len(edges.get(i, ()))
+    indices = np.empty(indptr[-1], dtype=np.int32)
+    values = np.empty(indptr[-1], dtype=np.int32)
+    for i in range(n):
+        targets = sorted(edges.get(i, {}).items())
+        indices[indptr[i]:indptr[i + 1]] = [t for t, _ in targets]
+        values[indptr[i]:indptr[i + 1]] = [v for _, v in targets]
+    return indptr, indices, values
+
+
+class PrerequisiteGraph:
+    """
+    Course prerequisite graph stored as CSR adjacency arrays.
+
+    Nodes are (school, "DEPT NUM") pairs. ``req_*`` arrays point from a course to
+    its direct prerequisites, with ``req_groups`` numbering the requirement group
+    of each edge (edges sharing a group are alternatives); ``closure`` is a bit-packed (n x n) matrix where
+    row i holds every course transitively required by course i. Reading a column
+    of ``closure`` gives every course a given course eventually unlocks.
+    """
+
+    def __init__(self, schools: List[str], codes: List[str],
+                 req_indptr: np.ndarray, req_indices: np.ndarray,
+                 unlock_indptr: np.ndarray, unlock_indices: np.ndarray,
+                 closure: np.ndarray, req_groups: np.ndarray = None):
+        self.schools = list(schools)
+        self.codes = list(codes)
+        self.req_indptr = req_indptr
+        self.req_indices = req_indices
+        self.unlock_indptr = unlock_indptr
+        self.unlock_indices = unlock_indices
+        self.closure = closure
+        # Graphs saved before groups were recorded: every prerequisite is its own group
+        self.req_groups = req_groups if req_groups is not None else np.arange(len(req_indices), dtype=np.int32)
+        self._index = {(s, c): i for i, (s, c) in enumerate(zip(self.schools, self.codes))}
+        self._by_code: Dict[str, List[int]] = defaultdict(list)
+        for i, c in enumerate(self.codes):
+            self._by_code[c].append(i)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    # ---------- construction ----------
+
+    @classmethod
+    def from_edges(cls, nodes: Iterable[Tuple[str, str]],
+                   edges: Iterable[Tuple[Tuple[str, str], Tuple[str, str], int]]) -> "PrerequisiteGraph":
+        """Build from (course, prerequisite, requirement group) triples."""
+        node_list: List[Tuple[str, str]] = []
+        index: Dict[Tuple[str, str], int] = {}
+
+        def add(node):
+            if node not in index:
+                index[node] = len(node_list)
+                node_list.append(node)
+            return index[node]
+
+        for node in nodes:
+            add(node)
+        requires: Dict[int, Dict[int, int]] = defaultdict(dict)
+        unlocks: Dict[int, Dict[int, int]] = defaultdict(dict)
+        for course, prereq, group in edges:
+            c, p = add(course), add(prereq)
+            if c == p:
+                continue
+            requires[c].setdefault(p, group)
+            unlocks[p].setdefault(c, group)
+
+        n = len(node_list)
+        req_indptr, req_indices, req_groups = _to_csr(n, requires)
+        unlock_indptr, unlock_indices, _ = _to_csr(n, unlocks)
+        closure = cls._transitive_closure(n, req_indptr, req_indices)
+        return cls(
+            [s for s, _ in node_list], [c for _, c in node_list],
+            req_indptr, req_indices, unlock_indptr, unlock_indices, closure, req_groups
+        )
+
+    @staticmethod
+    def _transitive_closure(n: int, indptr: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        # DFS per node over the CSR arrays; cycles in catalog data are tolerated
+        closure = np.zeros((n, (n + 7) // 8), dtype=np.uint8)
+        row = np.zeros(n, dtype=bool)
+        for start in range(n):
+            if indptr[start] == indptr[start + 1]:
+                continue
+            row[:] = False
+            stack = list(indices[indptr[start]:indptr[start + 1]])
+            while stack:
+                node = stack.pop()
+                if row[node]:
+                    continue
+                row[node] = True
+                stack.extend(indices[indptr[node]:indptr[node + 1]])
+            row[start] = False
+            closure[start] = np.packbits(row)
+        return closure
+
+    # ---------- persistence ----------
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(
+            path,
+            schools=np.array(self.schools, dtype=str),
+            codes=np.array(self.codes, dtype=str),
+            req_indptr=self.req_indptr,
+            req_indices=self.req_indices,
+            unlock_indptr=self.unlock_indptr,
+            unlock_indices=self.unlock_indices,
+            closure=self.closure,
+            req_groups=self.req_groups,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "PrerequisiteGraph":
+        with np.load(path) as data:
+            return cls(
+                data["schools"].tolist(), data["codes"].tolist(),
+                data["req_indptr"], data["req_indices"],
+                data["unlock_indptr"], data["unlock_indices"],
+                data["closure"],
+                data["req_groups"] if "req_groups" in data.files else None,
+            )
+
+    # ---------- queries ----------
+
+    def lookup(self, code: str, school: str = None) -> List[int]:
+        if school:
+            i = self._index.get((school, code))
+            return [] if i is None else [i]
+        return list(self._by_code.get(code, []))
+
+    def _nodes(self, idx: Iterable[int]) -> List[Tuple[str, str]]:
+        return [(self.schools[i], self.codes[i]) for i in idx]
+
+    @staticmethod
+    def _nearest(starts: List[int], indptr: np.ndarray, indices: np.ndarray, limit: int) -> List[int]:
+        # Breadth-first over the CSR arrays, so a capped list keeps the closest courses
+        seen = set(starts)
+        found: List[int] = []
+        frontier = list(starts)
+        while frontier and len(found) < limit:
+            next_frontier: List[int] = []
+            for node in frontier:
+                for target in indices[indptr[node]:indptr[node + 1]].tolist():
+                    if target not in seen:
+                        seen.add(target)
+                        found.append(target)
+                        next_frontier.append(target)
+            frontier = next_frontier
+        return found[:limit]
+
+    def prerequisites(self, code: str, school: str = None, transitive: bool = False,
+                      limit: int = None) -> List[Tuple[str, str]]:
+        """Direct or transitive prerequisites; with ``limit``, at most that many, nearest first."""
+        if transitive and limit is not None:
+            return self._nodes(self._nearest(self.lookup(code, school), self.req_indptr, self.req_indices, limit))
+        result: List[int] = []
+        for i in self.lookup(code, school):
+            if transitive:
+                row = np.unpackbits(self.closure[i], count=len(self))
+                result.extend(np.flatnonzero(row).tolist())
+            else:
+                result.extend(self.req_indices[self.req_indptr[i]:self.req_indptr[i + 1]].tolist())
+        return self._nodes(dict.fromkeys(result))
+
+    def unlocks(self, code: str, school: str = None, transitive: bool = False,
+                limit: int = None) -> List[Tuple[str, str]]:
+        """Courses that list ``code`` as a (possibly alternative) prerequisite, directly or transitively."""
+        if transitive and limit is not None:
+            return self._nodes(self._nearest(self.lookup(code, school), self.unlock_indptr, self.unlock_indices, limit))
+        result: List[int] = []
+        for i in self.lookup(code, school):
+            if transitive:
+                column = (self.closure[:, i >> 3] >> (7 - (i & 7))) & 1
+                result.extend(np.flatnonzero(column).tolist())
+            else:
+                result.extend(self.unlock_indices[self.unlock_indptr[i]:self.unlock_indptr[i + 1]].tolist())
+        return self._nodes(dict.fromkeys(result))
+
+    def requirement_groups(self, code: str, school: str) -> List[List[Tuple[str, str]]]:
+        """Direct prerequisites grouped as in the catalog: every group is needed, any one course of a group does."""
+        groups: Dict[int, List[int]] = defaultdict(list)
+        for i in self.lookup(code, school):
+            span = slice(self.req_indptr[i], self.req_indptr[i + 1])
+            for target, group in zip(self.req_indices[span].tolist(), self.req_groups[span].tolist()):
+                groups[group].append(target)
+        return [self._nodes(members) for _, members in sorted(groups.items())]
+
+    def find_courses(self, text: str) -> List[Tuple[str, str]]:
+        """Return the known graph nodes mentioned in ``text``."""
+        found: List[Tuple[str, str]] = []
+        for code in extract_course_codes((text or "").upper()):
+            found.extend(self._nodes(self.lookup(code)))
+        return found
+
+
+def build_prerequisite_graph(brown_files: List[str], lsu_files: List[str]) -> PrerequisiteGraph:
+    """Parse the LSU ``Reqs`` field and Brown "Prerequisite:" clauses into a graph."""
+    nodes: List[Tuple[str, str]] = []
+    edges: List[Tuple[Tuple[str, str], Tuple[str, str]]] = []
+
+    for file_path in lsu_files:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for item in data:
+            course = (LSU_SCHOOL, f"{item.get('Dept', '')} {item.get('Num', '')}")
+            nodes.append(course)
+            for group, codes in enumerate(extract_requirement_groups(item.get("Reqs", ""))):
+                edges.extend((course, (LSU_SCHOOL, code), group) for code in codes)
+
+    for file_path in brown_files:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for item in data:
+            course = (BROWN_SCHOOL, f"{item.get('department_short', '')} {item.get('code', '')}")
+            nodes.append(course)
+            groups = [
+                codes for clause in BROWN_PREREQ_RE.findall(item.get("description", ""))
+                for codes in extract_requirement_groups(clause)
+            ]
+            for group, codes in enumerate(groups):
+                edges.extend((course, (BROWN_SCHOOL, code), group) for code in codes)
+
+    graph = PrerequisiteGraph.from_edges(nodes, edges)
+    logging.info(f"Built prerequisite graph with {len(graph)} courses and {len(graph.req_indices)} edges.")
+    return graph
@@ -0,0 +1,52 @@
+from typing import Dict
+
+import faiss
+import numpy as np
+
+from mmr import normalize_rows
+
+
+QUANTIZERS = {
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+BYTES_PER_COMPONENT = {None: 4, "float16": 2, "int8": 1}
+
+
+def project(vectors: np.ndarray, dimensions: int = None) -> np.ndarray:
+    """
+    Keep the leading ``dimensions`` components and L2-normalize, so L2 search on
+    the result ranks by cosine. text-embedding-004 is trained so that its
+    leading dimensions carry most of the signal, which makes truncation usable.
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    if dimensions:
+        vectors = vectors[:, :dimensions]
+    return np.ascontiguousarray(normalize_rows(vectors))
+
+
+def build_compressed_index(vectors: np.ndarray, mode: str = None, dimensions: int = None) -> faiss.Index:
+    """Flat index over projected vectors, scalar-quantized to float16 or int8 when ``mode`` is set."""
+    if mode is not None and mode not in QUANTIZERS:
+        raise ValueError(f"Unknown quantization mode: {mode} (expected one of {', '.join(QUANTIZERS)})")
+    projected = project(vectors, dimensions)
+    if mode is None:
+        index = faiss.IndexFlatL2(projected.shape[1])
+    else:
+        index = faiss.IndexScalarQuantizer(projected.shape[1], QUANTIZERS[mode], faiss.METRIC_L2)
+        index.train(projected)  # int8 learns per-dimension ranges; a no-op for float16
+    index.add(projected)
+    return index
+
+
+def memory_per_million(full_dimensions: int, mode: str = None, dimensions: int = None) -> Dict[str, float]:
+    """
+    MiB per million vectors: the searchable index held in RAM, and the
+    full-precision float32 copy kept on disk (memory-mapped) for rescoring.
+    """
+    searched = (dimensions or full_dimensions) * BYTES_PER_COMPONENT[mode]
+    rescoring = full_dimensions * 4 if (mode or dimensions) else 0
+    return {
+        "index_mib_in_memory": searched * 1_000_000 / 2 ** 20,
+        "rescoring_mib_on_disk": rescoring * 1_000_000 / 2 ** 20,
+    }
@@ -1,19 +1,31 @@
 import os
+import re
 import json
 import logging
 import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
 from langchain.document_loaders import PyPDFLoader
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.vectorstores import FAISS
 from langchain.prompts import PromptTemplate
 from langchain.chains import RetrievalQA
 import numpy as np
+from prereq_graph import PrerequisiteGraph, build_prerequisite_graph, course_key, BROWN_SCHOOL, LSU_SCHOOL
+from meeting_times import meeting_key, parse_question_window, parse_time_window, schedule_mask
+from mmr import adaptive_fetch_k, cosine_scores, maximal_marginal_relevance, normalize_rows
+from bulletin_chunker import chunk_bulletin
+from shard_manager import ShardManager, ShardSpec, Shard, CandidateRef
+from index_versions import IndexVersion, IndexVersionStore
+from single_flight import SingleFlight
+from deadlines import Deadline, DeadlineExceeded, call_with_timeout, hedged_call
+from sessions import RetrievalSession, SessionStore
+from artifacts import ARTIFACT_FILE, ArtifactError, load_data_manifest, sha256_file, verify_artifact, write_artifact
 
 
 logging.basicConfig(
@@ -30,137 +42,762 @@ logging.getLogger().addHandler(console_handler)
 
 class RAGConfig:
     DATABASE_PATH = "database"
+    DATA_MANIFEST = "data_manifest.json"
+    # Serving containers set RAG_ALLOW_INDEX_BUILD=0 and only load artifacts made by build_index.py
+    ALLOW_INDEX_BUILD = os.getenv("RAG_ALLOW_INDEX_BUILD", "1") != "0"
+    INDEX_VERSION = os.getenv("RAG_INDEX_VERSION") or None  # pin a version instead of following CURRENT
+    VERIFY_ARTIFACT_CHECKSUMS = True
     EMBEDDING_MODEL = "models/text-embedding-004"
     LLM_MODEL = "gemini-2.0-flash"
     LLM_TEMPERATURE = 0.0
     MAX_OUTPUT_TOKENS = 10000
     RETRIEVER_K = 50
     RETRIEVER_FETCH_K = 70
+    RETRIEVER_FETCH_K_MAX = 200
+    FETCH_SCORE_MARGIN = 0.15
+    FILTERED_FETCH_MULTIPLIER = 4
+    MMR_LAMBDA = 0.5
+    MMR_MIN_GAIN = None  # e.g. 0.0 stops MMR once redundancy outweighs relevance
+    MMR_MIN_K = 10
+    PREREQ_GRAPH_FILE = "prereq_graph.npz"
+    PREREQ_BOOST_K = 20
+    PREREQ_MAX_LISTED = 25  # courses listed per relation in responses and prompts; totals are reported too
+    SHARDS_DIR = "shards"
+    SHARD_SEARCH_WORKERS = 4
+    VECTOR_QUANTIZATION = None  # None (float32), "float16" or "int8"
+    EMBEDDING_DIMENSIONS = None  # e.g. 256 to search truncated vectors; None keeps all 768
+    RESCORE_OVERSAMPLE = 3
+    INDEX_VERSION_CHECK_INTERVAL = 60
+    BULLETIN_PROSE_CHUNK_SIZE = 1500
+    REQUEST_DEADLINE_S = 12.0  # end-to-end budget for get_response, from the request's arrival
+    EMBED_TIMEOUT_S = 2.0
+    EMBED_HEDGE_AFTER_S = 0.5  # start a second embedding call if the first is this slow; None disables
+    EMBED_MAX_ATTEMPTS = 2
+    LLM_TIMEOUT_S = 10.0  # cap on the generation stage; also the Gemini client's own timeout
+    LLM_MIN_BUDGET_S = 1.0  # answer from the template if less than this is left for generation
+    REQUEST_THREADS = 40  # threads serving sync endpoints (anyio's limiter; main.py sizes it to this)
+    FALLBACK_MAX_COURSES = 10
+    SESSION_MAX_SESSIONS = 128  # each holds up to SESSION_POOL_MAX float32 vectors (~2.4 MB)
+    SESSION_TTL_S = 1800
+    SESSION_POOL_MAX = 800
+    FOLLOW_UP_MIN_SIMILARITY = 0.8  # a question this close to the session topic refines it
+    FOLLOW_UP_QUERY_WEIGHT = 0.5  # weight of a follow-up question when blended into the topic vector
 
 
-class RAGBackend:
-    def __init__(self, json_files: List[str] = None, pdf_files: List[str] = None):
-        self.json_files = [
-            "primary_data/winter2026/winter_2026_courses.json",
-            "primary_data/spring2026/spring_2026_courses.json",
-            "primary_data/fall2025/fall_2025_courses.json",
-            "primary_data/spring2025/spring_2025_courses.json"
-        ]
-        self.lsu_uni_files = [
-            "secondary_data/LSU_courses.json"
-        ]
-        self.pdf_files = [
-            "secondary_data/2025-26-bulletin.pdf",
-            "secondary_data/universitycourses.pdf"
-        ]
+UNLOCKS_QUERY_RE = re.compile(r"\b(after|unlock\w*|leads? to|opens? up|next)\b", re.IGNORECASE)
+REQUIRES_QUERY_RE = re.compile(r"\b(prereq\w*|requir\w*|need\w*|before)\b", re.IGNORECASE)
+# The course is the object of "require"/"need": "which courses require MATH 1550?" asks what it unlocks
+REQUIRED_BY_BEFORE_RE = re.compile(
+    r"\b(courses?|classes?|what|which)\s+((that|which)\s+)?(require|need)s?\b", re.IGNORECASE
+)
+# ... or is called a prerequisite: "is MATH 1550 a prerequisite for", "MATH 1550 as a prerequisite"
+REQUIRED_BY_AFTER_RE = re.compile(
+    r"\b((is|as)\s+(an?\s+)?(prereq\w*|requirement|required)|(prereq\w*|requirement|required)\s+(for|by))\b",
+    re.IGNORECASE
+)
+UNIVERSITY_QUERY_RES = {
+    LSU_SCHOOL: re.compile(r"\b(LSU|Louisiana)\b", re.IGNORECASE),
+    BROWN_SCHOOL: re.compile(r"\bBrown\b"),
+}
+# "only ones on Tuesday", "which have no prerequisites", "any of those in the evening"
+FOLLOW_UP_QUERY_RE = re.compile(
+    r"^\s*(only|just|and|but|also|what about|how about|any of|which\s+(of|have|has|are|is|meet|do|does|don't|require|need))\b"
+    r"|\b(these|those|them|ones)\b",
+    re.IGNORECASE
+)
+NO_PREREQ_QUERY_RE = re.compile(
+    r"\b(no|without|don'?t (need|require|have))\s+(any\s+)?(prereq\w*|requirements?)\b", re.IGNORECASE
+)
 
+
+class RAGBackend:
+    def __init__(self, json_files: List[str] = None, pdf_files: List[str] = None, load_index: bool = True):
         load_dotenv()
         self.config = RAGConfig()
+
+        # Source files are declared in the data manifest (see data_manifest.json); rebuilds re-read it
+        self.data_manifest = load_data_manifest(self.config.DATA_MANIFEST)
+
         self.embeddings = self._initialize_embeddings()
-        self.vector_store = self._load_vector_store()
+        self.versions = IndexVersionStore(self.config.DATABASE_PATH)
+        self._rebuild_lock = threading.Lock()
+        self._previous_index: IndexVersion = None
+        self.rebuild_status: Dict[str, Any] = {"state": "idle"}
+        self._inflight = SingleFlight()
+        # Separate pools so abandoned LLM calls can never starve embeddings. Embeddings: every request
+        # thread with all its hedged attempts. LLM: one call per request thread, plus room for calls
+        # that outlive their request by up to the client timeout.
+        self._embed_pool = ThreadPoolExecutor(
+            max_workers=self.config.REQUEST_THREADS * self.config.EMBED_MAX_ATTEMPTS, thread_name_prefix="embed"
+        )
+        self._llm_pool = ThreadPoolExecutor(max_workers=2 * self.config.REQUEST_THREADS, thread_name_prefix="llm")
+        self.sessions = SessionStore(self.config.SESSION_MAX_SESSIONS, self.config.SESSION_TTL_S)
+        self.index = self._load_current_index() if load_index else None
+        self._last_version_check = time.time()
         self.llm = self._initialize_llm()
         self.prompt_template = self._create_prompt_template()
 
+    @staticmethod
+    def _manifest_paths(data: List[Dict[str, Any]], kind: str) -> List[str]:
+        return [entry["path"] for entry in data if entry["kind"] == kind]
+
+    @property
+    def json_files(self) -> List[str]:
+        return self._manifest_paths(self.data_manifest, "brown_json")
+
+    @property
+    def lsu_uni_files(self) -> List[str]:
+        return self._manifest_paths(self.data_manifest, "lsu_json")
+
+    @property
+    def pdf_files(self) -> List[str]:
+        return self._manifest_paths(self.data_manifest, "bulletin_pdf")
+
+    def _build_parameters(self) -> Dict[str, Any]:
+        # Everything an index depends on besides the data bytes (checked per shard); serving refuses
+        # artifacts built otherwise
+        return {
+            "embedding_model": self.config.EMBEDDING_MODEL,
+            "vector_quantization": self.config.VECTOR_QUANTIZATION,
+            "embedding_dimensions": self.config.EMBEDDING_DIMENSIONS,
+            "bulletin_prose_chunk_size": self.config.BULLETIN_PROSE_CHUNK_SIZE,
+        }
+
     def _initialize_embeddings(self) -> GoogleGenerativeAIEmbeddings:
-        return GoogleGenerativeAIEmbeddings(model=self.config.EMBEDDING_MODEL)
+        return GoogleGenerativeAIEmbeddings(
+            model=self.config.EMBEDDING_MODEL,
+            request_options={"timeout": self.config.EMBED_TIMEOUT_S}
+        )
 
     def _initialize_llm(self):
+        # Client timeout at the stage cap and no retries, so a call abandoned by the deadline frees its thread
         return ChatGoogleGenerativeAI(
             model=self.config.LLM_MODEL,
             temperature=self.config.LLM_TEMPERATURE,
-            max_output_tokens=self.config.MAX_OUTPUT_TOKENS
+            max_output_tokens=self.config.MAX_OUTPUT_TOKENS,
+            timeout=self.config.LLM_TIMEOUT_S,
+            max_retries=0
         )
 
-    def _load_documents(self) -> List[Document]:
-        all_documents: List[Document] = []
+    def _load_brown_json(self, file_path: str) -> List[Document]:
+        documents: List[Document] = []
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for item in data:
+            content = (
+                f"Title: {item.get('title', '')}\n"
+                f"Code: {item.get('code', '')}\n"
+                f"Department: {item.get('department_full', '')} ({item.get('department_short', '')})\n"
+                f"Professor: {item.get('professor', '')}\n"
+                f"Time: {item.get('time', '')}\n"
+                f"Description:\n{item.get('description', '')}"
+            )
+            documents.append(Document(
+                page_content=content,
+                metadata={
+                    "title": item.get("title", ""),
+                    "code": item.get("code", ""),
+                    "department": item.get("department_short", ""),
+                    "professor": item.get("professor", ""),
+                    "time": item.get("time", ""),
+                    "source": Path(file_path).name
+                }
+            ))
+        return documents
+
+    def _load_bulletin_pdf(self, pdf_path: str) -> List[Document]:
+        # One document per course entry, prose grouped by section
+        loader = PyPDFLoader(pdf_path)
+        pdf_docs = loader.load()
+        for i, doc in enumerate(pdf_docs, start=1):
+            doc.metadata["page"] = i
+        bulletin_docs = chunk_bulletin(
+            pdf_docs, Path(pdf_path).name, prose_chunk_size=self.config.BULLETIN_PROSE_CHUNK_SIZE
+        )
+        course_count = sum(1 for doc in bulletin_docs if doc.metadata["doc_type"] == "course")
+        logging.info(f"Chunked {pdf_path}: {course_count} course entries, {len(bulletin_docs) - course_count} prose chunks.")
+        return bulletin_docs
+
+    def _load_lsu_json(self, file_path: str) -> List[Document]:
+        documents: List[Document] = []
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for item in data:
+            content = (
+                f"Department: {item.get('Dept', '')}\n"
+                f"Course Number: {item.get('Num', '')}\n"
+                f"Course Name: {item.get('Name', '')}\n"
+                f"Description:\n{item.get('Desc', '')}\n"
+                f"Requirements: {item.get('Reqs', '')}\n"
+                f"University: {item.get('university_name', '')}"
+            )
+            documents.append(Document(
+                page_content=content,
+                metadata={
+                    "Dept": item.get("Dept", ""),
+                    "Num": item.get("Num", ""),
+                    "Name": item.get("Name", ""),
+                    "Reqs": item.get("Reqs", ""),
+                    "university_name": item.get("university_name", ""),
+                    "source": Path(file_path).name
+                }
+            ))
+        return documents
 
-        # Load JSON documents
-        for file_path in self.json_files:
-            if not os.path.exists(file_path):
+    def _shard_spec(self, entry: Dict[str, Any]) -> ShardSpec:
+        # One shard per Brown term, per LSU catalog and per bulletin PDF
+        path = entry["path"]
+        if entry["kind"] == "brown_json":
+            term = Path(path).parent.name
+            return ShardSpec(f"brown-{term}", BROWN_SCHOOL, path, self._load_brown_json, term=term)
+        if entry["kind"] == "lsu_json":
+            return ShardSpec(f"lsu-{Path(path).stem.lower()}", LSU_SCHOOL, path, self._load_lsu_json)
+        return ShardSpec(f"bulletin-{Path(path).stem.lower()}", BROWN_SCHOOL, path, self._load_bulletin_pdf)
+
+    def _shard_specs(self, data: List[Dict[str, Any]]) -> List[ShardSpec]:
+        return [self._shard_spec(entry) for entry in data]
+
+    def _open_index(self, name: str, path: str, data: List[Dict[str, Any]] = None) -> IndexVersion:
+        """
+        Load a version. With an artifact, verify it and serve exactly the shards it
+        declares; without one (inline builds only), build the shards of ``data``
+        (default: the data manifest) that are missing.
+        """
+        artifact = None
+        if not self.config.ALLOW_INDEX_BUILD or os.path.exists(os.path.join(path, ARTIFACT_FILE)):
+            artifact = verify_artifact(path, self._build_parameters(), self.config.VERIFY_ARTIFACT_CHECKSUMS)
+            data = artifact["data"]
+            self._log_data_drift(artifact)
+        elif data is None:
+            data = self.data_manifest
+        shards = ShardManager(
+            os.path.join(path, self.config.SHARDS_DIR),
+            self._shard_specs(data),
+            self.embeddings,
+            max_workers=self.config.SHARD_SEARCH_WORKERS,
+            quantization=self.config.VECTOR_QUANTIZATION,
+            dimensions=self.config.EMBEDDING_DIMENSIONS,
+            rescore_oversample=self.config.RESCORE_OVERSAMPLE
+        )
+        # A verified artifact is complete as it is; never embed into it
+        shards.load_all(build_missing=self.config.ALLOW_INDEX_BUILD and artifact is None)
+        return IndexVersion(name, path, shards, self._load_prereq_graph(path, data), artifact)
+
+    def _log_data_drift(self, artifact: Dict[str, Any]) -> None:
+        # The artifact is served as built; point out manifest entries it doesn't reflect yet
+        built = {entry["path"]: entry.get("sha256") for entry in artifact["data"]}
+        for entry in self.data_manifest:
+            path = entry["path"]
+            if not os.path.exists(path):
                 continue
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            for item in data:
-                content = (
-                    f"Title: {item.get('title', '')}\n"
-                    f"Code: {item.get('code', '')}\n"
-                    f"Department: {item.get('department_full', '')} ({item.get('department_short', '')})\n"
-                    f"Professor: {item.get('professor', '')}\n"
-                    f"Time: {item.get('time', '')}\n"
-                    f"Description:\n{item.get('description', '')}"
-                )
-                all_documents.append(Document(
-                    page_content=content,
-                    metadata={
-                        "title": item.get("title", ""),
-                        "code": item.get("code", ""),
-                        "department": item.get("department_short", ""),
-                        "professor": item.get("professor", ""),
-                        "time": item.get("time", ""),
-                        "source": Path(file_path).name
-                    }
-                ))
-
-        # Load PDF documents
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        for pdf_path in self.pdf_files:
-            if not os.path.exists(pdf_path):
+            if path not in built:
+                logging.warning(f"{path} is not in index version {artifact['version']}; "
+                                f"add it with `python build_index.py --base current`.")
+            elif self.config.VERIFY_ARTIFACT_CHECKSUMS and sha256_file(path) != built[path]:
+                logging.warning(f"{path} changed since index version {artifact['version']} was built; "
+                                f"re-embed it with `python build_index.py --base current`.")
+
+    def _reusable_shards(self, data: List[Dict[str, Any]], base_path: str, rebuild: List[str] = None) -> List[str]:
+        """
+        Shards of the version at ``base_path`` that can be copied instead of
+        re-embedded: built with our parameters from a source file whose sha256
+        is unchanged, and not named in ``rebuild``.
+        """
+        built = None
+        if os.path.exists(os.path.join(base_path, ARTIFACT_FILE)):
+            try:
+                base_artifact = verify_artifact(base_path, self._build_parameters(),
+                                                self.config.VERIFY_ARTIFACT_CHECKSUMS)
+            except ArtifactError as e:
+                logging.warning(f"Not reusing shards of {base_path}: {str(e)}")
+                return []
+            built = {self._shard_spec(entry).name: entry for entry in base_artifact["data"]}
+
+        reusable: List[str] = []
+        for entry in data:
+            name = self._shard_spec(entry).name
+            base_shard = os.path.join(base_path, self.config.SHARDS_DIR, name)
+            if name in (rebuild or []) or not os.path.isdir(base_shard):
                 continue
-            loader = PyPDFLoader(pdf_path)
-            pdf_docs = loader.load()
-            for i, doc in enumerate(pdf_docs, start=1):
-                doc.metadata["source"] = Path(pdf_path).name
-                doc.metadata["page"] = i
-            split_docs = text_splitter.split_documents(pdf_docs)
-            all_documents.extend(split_docs)
-
-        # Load LSU JSON documents
-        lsu_file_path = "secondary_data/LSU_courses.json"
-        if os.path.exists(lsu_file_path):
-            with open(lsu_file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            for item in data:
-                content = (
-                    f"Department: {item.get('Dept', '')}\n"
-                    f"Course Number: {item.get('Num', '')}\n"
-                    f"Course Name: {item.get('Name', '')}\n"
-                    f"Description:\n{item.get('Desc', '')}\n"
-                    f"Requirements: {item.get('Reqs', '')}\n"
-                    f"University: {item.get('university_name', '')}"
+            # Versions built inline have no record of their sources; their shards are trusted as they are
+            if built is not None:
+                previous = built.get(name)
+                if (previous is None or previous["path"] != entry["path"] or not os.path.exists(entry["path"])
+                        or sha256_file(entry["path"]) != previous.get("sha256")):
+                    continue
+            reusable.append(name)
+        return reusable
+
+    def _build_index_version(self, data: List[Dict[str, Any]], base_path: str = None,
+                             rebuild: List[str] = None) -> IndexVersion:
+        """
+        Build a version from ``data``. With ``base_path``, shards whose source is
+        unchanged are copied from that version; the rest (changed, new or named in
+        ``rebuild``) are embedded.
+        """
+        name, path = self.versions.create()
+        logging.info(f"Building index version {name}...")
+        try:
+            reused = self._reusable_shards(data, base_path, rebuild) if base_path else []
+            for shard_name in reused:
+                shutil.copytree(
+                    os.path.join(base_path, self.config.SHARDS_DIR, shard_name),
+                    os.path.join(path, self.config.SHARDS_DIR, shard_name)
+                )
+            if base_path:
+                logging.info(f"Reusing {len(reused)} of {len(data)} shards from {base_path}: "
+                             f"{', '.join(reused) or 'none'}.")
+            index = self._open_index(name, path, data)
+            index.artifact = write_artifact(path, name, self._build_parameters(), data)
+            return index
+        except Exception:
+            self.versions.discard(name)
+            raise
+
+    def _load_current_index(self) -> IndexVersion:
+        name = self.config.INDEX_VERSION or self.versions.current()
+        if name:
+            path = self.versions.version_path(name)
+            if not os.path.isdir(path):
+                raise ArtifactError(f"Index version {name} not found in {self.versions.versions_root}.")
+            logging.info(f"Loading index version {name}...")
+            return self._open_index(name, path)
+
+        if not self.config.ALLOW_INDEX_BUILD:
+            raise ArtifactError(
+                f"No index artifact in {self.config.DATABASE_PATH} and inline builds are disabled "
+                f"(RAG_ALLOW_INDEX_BUILD=0). Build one with `python build_index.py`."
+            )
+        index = self._build_index_version([entry for entry in self.data_manifest if os.path.exists(entry["path"])])
+        self.versions.promote(index.name)
+        return index
+
+    def build_artifact(self, promote: bool = True, base: str = None) -> IndexVersion:
+        """
+        Build an index version from the data manifest, record its artifact
+        manifest (parameters and checksums) and optionally promote it. With
+        ``base`` (a version name or "current"), shards whose source file is
+        unchanged are copied from that version instead of re-embedded. Every
+        non-optional data file must exist. Used by build_index.py.
+        """
+        missing = [
+            entry["path"] for entry in self.data_manifest
+            if not entry.get("optional") and not os.path.exists(entry["path"])
+        ]
+        if missing:
+            raise ArtifactError(f"Data files declared in {self.config.DATA_MANIFEST} are missing: {', '.join(missing)}")
+
+        base_path = None
+        if base:
+            base_name = self.versions.current() if base == "current" else base
+            if not base_name or not os.path.isdir(self.versions.version_path(base_name)):
+                raise ArtifactError(
+                    f"Base index version {base_name or base} not found in {self.versions.versions_root}."
                 )
-                all_documents.append(Document(
-                    page_content=content,
-                    metadata={
-                        "Dept": item.get("Dept", ""),
-                        "Num": item.get("Num", ""),
-                        "Name": item.get("Name", ""),
-                        "Reqs": item.get("Reqs", ""),
-                        "university_name": item.get("university_name", ""),
-                        "source": Path(lsu_file_path).name
-                    }
-                ))
-
-        logging.info(f"Loaded {len(all_documents)} total documents (JSON + PDF + LSU JSON).")
-        return all_documents
-
-
-    def _load_vector_store(self) -> FAISS:
-        index_file = os.path.join(self.config.DATABASE_PATH, "index.faiss")
-        if os.path.exists(index_file):
-            logging.info("Loading existing vector store...")
-            return FAISS.load_local(
-                self.config.DATABASE_PATH,
-                self.embeddings,
-                allow_dangerous_deserialization=True
+            base_path = self.versions.version_path(base_name)
+
+        data = [entry for entry in self.data_manifest if os.path.exists(entry["path"])]
+        index = self._build_index_version(data, base_path)
+        verify_artifact(index.path, self._build_parameters())
+        if promote:
+            previous = self.versions.current()
+            self.versions.promote(index.name)
+            self.versions.prune(keep=[index.name] + ([previous] if previous else []))
+        return index
+
+    @property
+    def shards(self) -> ShardManager:
+        return self.index.shards
+
+    @property
+    def prereq_graph(self) -> PrerequisiteGraph:
+        return self.index.prereq_graph
+
+    def _swap_index(self, new_index: IndexVersion) -> None:
+        # A single reference assignment: queries that already read self.index finish on the old version
+        self._previous_index, self.index = self.index, new_index
+        self.versions.prune(keep=[new_index.name, self._previous_index.name])
+        self.sessions.retain_index(new_index.name)
+        logging.info(f"Serving index version {new_index.name} (previous: {self._previous_index.name}).")
+
+    def _rebuild_index_locked(self, data: List[Dict[str, Any]], shard_names: List[str] = None) -> str:
+        # Named shards are re-embedded along with any new or changed source; the rest are copied
+        base_path = self.index.path if shard_names else None
+        new_index = self._build_index_version(data, base_path, rebuild=shard_names)
+        self.versions.promote(new_index.name)
+        self.data_manifest = data
+        self._swap_index(new_index)
+        return new_index.name
+
+    def _acquire_rebuild(self, shard_names: List[str] = None) -> List[Dict[str, Any]]:
+        # Returns the data to build from: the manifest as it is now, so newly declared terms can be added
+        if not self.config.ALLOW_INDEX_BUILD:
+            raise RuntimeError("Index builds are disabled in this process (RAG_ALLOW_INDEX_BUILD=0); "
+                               "build with build_index.py and promote the artifact.")
+        data = [entry for entry in load_data_manifest(self.config.DATA_MANIFEST) if os.path.exists(entry["path"])]
+        unknown = set(shard_names or []) - {spec.name for spec in self._shard_specs(data)}
+        if unknown:
+            raise ValueError(f"Unknown shards: {', '.join(sorted(unknown))}")
+        if not self._rebuild_lock.acquire(blocking=False):
+            raise RuntimeError("An index rebuild is already running.")
+        return data
+
+    def rebuild_index(self, shard_names: List[str] = None) -> str:
+        """
+        Build a new index version from the current data manifest (all shards,
+        or only ``shard_names`` plus new or changed sources, with the rest
+        copied from the live version), promote it and swap it in. The previous
+        version is kept for rollback. Returns the new version name.
+        """
+        data = self._acquire_rebuild(shard_names)
+        try:
+            return self._rebuild_index_locked(data, shard_names)
+        finally:
+            self._rebuild_lock.release()
+
+    def start_rebuild(self, shard_names: List[str] = None) -> Dict[str, Any]:
+        """Run rebuild_index on a background thread; progress is reported in rebuild_status."""
+        data = self._acquire_rebuild(shard_names)
+        self.rebuild_status = {"state": "running", "shards": shard_names or "all", "started_at": time.time()}
+        threading.Thread(
+            target=self._run_rebuild, args=(data, shard_names), name="index-rebuild", daemon=True
+        ).start()
+        return self.rebuild_status
+
+    def _run_rebuild(self, data: List[Dict[str, Any]], shard_names: List[str] = None) -> None:
+        try:
+            version = self._rebuild_index_locked(data, shard_names)
+            self.rebuild_status = {**self.rebuild_status, "state": "succeeded", "version": version,
+                                   "finished_at": time.time()}
+        except Exception as e:
+            logging.error(f"Index rebuild failed: {str(e)}")
+            self.rebuild_status = {**self.rebuild_status, "state": "failed", "error": str(e),
+                                   "finished_at": time.time()}
+        finally:
+            self._rebuild_lock.release()
+
+    def rebuild_shard(self, name: str) -> str:
+        """Re-embed a single shard (e.g. a new term file) into a new version while the others keep serving."""
+        return self.rebuild_index([name])
+
+    def rollback_index(self) -> str:
+        """Swap back to the previous version; returns the version now being served."""
+        if not self._rebuild_lock.acquire(blocking=False):
+            raise RuntimeError("Cannot roll back while an index rebuild is running.")
+        try:
+            if self._previous_index is None:
+                raise RuntimeError("No previous index version to roll back to.")
+            previous = self._previous_index
+            self.versions.promote(previous.name)
+            self.index, self._previous_index = previous, self.index
+            self.sessions.retain_index(previous.name)
+            logging.info(f"Rolled back to index version {previous.name}.")
+            return previous.name
+        finally:
+            self._rebuild_lock.release()
+
+    def index_status(self) -> Dict[str, Any]:
+        index = self.index
+        return {
+            "current": index.name,
+            "previous": self._previous_index.name if self._previous_index else None,
+            "versions": self.versions.versions(),
+            "shards": {name: len(shard) for name, shard in index.shards.shards.items()},
+            "built_at": index.artifact["built_at"] if index.artifact else None,
+            "rebuild": self.rebuild_status,
+            "coalescing": self.coalescing_stats(),
+            "sessions": self.sessions.stats(),
+        }
+
+    def _follow_current_version(self) -> None:
+        # Another worker may have promoted a new version; load it off the request path
+        name = self.versions.current()
+        if name and name != self.index.name and self._rebuild_lock.acquire(blocking=False):
+            try:
+                new_index = self._open_index(name, self.versions.version_path(name))
+                self._swap_index(new_index)
+            except Exception as e:
+                logging.error(f"Failed to load index version {name}: {str(e)}")
+            finally:
+                self._rebuild_lock.release()
+
+    def _maybe_follow_current_version(self) -> None:
+        if self.config.INDEX_VERSION:
+            return
+        now = time.time()
+        if now - self._last_version_check < self.config.INDEX_VERSION_CHECK_INTERVAL:
+            return
+        self._last_version_check = now
+        threading.Thread(target=self._follow_current_version, name="index-follow", daemon=True).start()
+
+    def _load_prereq_graph(self, index_path: str, data: List[Dict[str, Any]]) -> PrerequisiteGraph:
+        graph_file = os.path.join(index_path, self.config.PREREQ_GRAPH_FILE)
+        if os.path.exists(graph_file):
+            logging.info("Loading existing prerequisite graph...")
+            return PrerequisiteGraph.load(graph_file)
+        if not self.config.ALLOW_INDEX_BUILD:
+            raise ArtifactError(f"{index_path} has no {self.config.PREREQ_GRAPH_FILE}.")
+
+        logging.info("Building prerequisite graph from course data...")
+        graph = build_prerequisite_graph(
+            self._manifest_paths(data, "brown_json"), self._manifest_paths(data, "lsu_json")
+        )
+        graph.save(graph_file)
+        logging.info("Prerequisite graph saved locally.")
+        return graph
+
+    def route_shards(self, question: str = "", universities: List[str] = None,
+                     sources: List[str] = None, index: IndexVersion = None) -> List[Shard]:
+        """Shards to search: explicit filters win, otherwise a university named in the question."""
+        index = index or self.index
+        if not universities:
+            mentioned = [school for school, pattern in UNIVERSITY_QUERY_RES.items() if pattern.search(question)]
+            if len(mentioned) == 1:
+                universities = mentioned
+        return index.shards.route(universities, sources)
+
+    def find_sections(self, meeting_filter: str = None, avoid_schedule: List[str] = None,
+                      shards: List[Shard] = None, meets_on: List[str] = None) -> set:
+        """
+        Keys (source, department, code) of sections that fit ``meeting_filter``
+        (e.g. "TTh afternoons"), don't conflict with any meeting string in
+        ``avoid_schedule`` and meet at some point in every ``meets_on`` window
+        (questions such as "only ones on Tuesday"). Returns None when no
+        constraint applies.
+        """
+        window = parse_time_window(meeting_filter) if meeting_filter else None
+        schedule = schedule_mask(avoid_schedule) if avoid_schedule else None
+        meets = [w for w in (parse_question_window(text) for text in meets_on or []) if w is not None]
+        if window is None and schedule is None and not meets:
+            return None
+
+        sections = set()
+        for shard in shards if shards is not None else self.shards.route():
+            meeting_index = shard.meeting_index
+            selected = meeting_index.scheduled.copy()
+            if window is not None:
+                selected &= meeting_index.within(window)
+            if schedule is not None:
+                selected &= meeting_index.without_conflict(schedule)
+            for meet in meets:
+                selected &= meeting_index.overlapping(meet)
+            sections |= meeting_index.keys_where(selected)
+        return sections
+
+    def answer_prerequisite_query(self, question: str, index: IndexVersion = None) -> Dict[str, Any]:
+        """
+        Answer "what does X unlock / what does X require" straight from the
+        prerequisite graph. Returns None for other questions or unknown courses.
+        """
+        graph = (index or self.index).prereq_graph
+        courses = graph.find_courses(question)
+        if not courses:
+            return None
+        school, code = courses[0]
+        relation = self._prerequisite_relation(question, code)
+        if relation is None:
+            return None
+        limit = self.config.PREREQ_MAX_LISTED
+        lookup = graph.unlocks if relation == "unlocks" else graph.prerequisites
+        direct = lookup(code, school=school)
+        transitive = lookup(code, school=school, transitive=True, limit=limit)
+        result = {
+            "course": code,
+            "school": school,
+            "relation": relation,
+            "direct": [c for _, c in direct[:limit]],
+            "direct_total": len(direct),
+            "transitive": [c for _, c in transitive],
+            "transitive_total": len(lookup(code, school=school, transitive=True)),
+        }
+        if relation == "requires":
+            # Every group is required; any one course of a group satisfies it
+            result["groups"] = [[c for _, c in group] for group in graph.requirement_groups(code, school)]
+        return result
+
+    @staticmethod
+    def _prerequisite_relation(question: str, code: str) -> Optional[str]:
+        """
+        Which way a prerequisite question points, judged by where ``code`` sits
+        relative to the verb: "what does MATH 1550 require?" -> "requires",
+        "which courses require MATH 1550?" -> "unlocks". None when unclear.
+        """
+        match = re.search(r"\s+".join(map(re.escape, code.split())), question, re.IGNORECASE)
+        if match is None:
+            return None
+        before, after = question[:match.start()], question[match.end():]
+        if REQUIRED_BY_BEFORE_RE.search(before) or REQUIRED_BY_AFTER_RE.search(after):
+            return "unlocks"
+        requires, unlocks = REQUIRES_QUERY_RE.search(question), UNLOCKS_QUERY_RE.search(question)
+        if requires and not unlocks:
+            return "requires"
+        if unlocks and not requires:
+            return "unlocks"
+        # Both or neither: leave the question to retrieval rather than guess the direction
+        return None
+
+    @staticmethod
+    def _describe_graph_result(graph_result: Dict[str, Any]) -> str:
+        """Prerequisite-graph answer as text for the prompt and the fallback answer."""
+        def listed(codes: List[str], total: int) -> str:
+            more = f" and {total - len(codes)} more" if total > len(codes) else ""
+            return (", ".join(codes) or "none") + more
+
+        course = f"{graph_result['course']} ({graph_result['school']})"
+        if graph_result["relation"] == "requires":
+            groups = [group[0] if len(group) == 1 else f"one of {' / '.join(group)}"
+                      for group in graph_result["groups"]]
+            return (
+                f"{course} requires: {'; and '.join(groups) or 'nothing listed'}\n"
+                f"Courses that may be needed along the way (any path, nearest first): "
+                f"{listed(graph_result['transitive'], graph_result['transitive_total'])}"
             )
+        return (
+            f"{course} is a prerequisite (alone or as one of several options) for: "
+            f"{listed(graph_result['direct'], graph_result['direct_total'])}\n"
+            f"Courses it eventually leads to (nearest first): "
+            f"{listed(graph_result['transitive'], graph_result['transitive_total'])}"
+        )
+
+    def _graph_refs(self, graph_result: Dict[str, Any], shards: List[Shard]) -> List[CandidateRef]:
+        # Candidates for the queried course and its graph neighbours
+        school = graph_result["school"]
+        related = [graph_result["course"]] + graph_result["direct"] + graph_result["transitive"]
+        refs: List[CandidateRef] = []
+        for code in dict.fromkeys(related):
+            for shard in shards:
+                refs.extend((shard, p) for p in shard.positions_by_course.get((school, code), []))
+            if len(refs) >= self.config.PREREQ_BOOST_K:
+                break
+        return refs[:self.config.PREREQ_BOOST_K]
+
+    @staticmethod
+    def _scored_document(ref: CandidateRef, score: float) -> Document:
+        # Copy so per-query scores never leak into the shared docstore
+        shard, position = ref
+        doc = shard.document_at(position)
+        return Document(page_content=doc.page_content, metadata={**doc.metadata, "score": score})
+
+    @staticmethod
+    def _document_type(metadata: Dict[str, Any]) -> str:
+        # JSON catalog entries predate the doc_type tag and are always courses
+        if "doc_type" in metadata:
+            return metadata["doc_type"]
+        return "course" if "code" in metadata or "Num" in metadata else "prose"
+
+    @staticmethod
+    def _course_entry(doc: Document) -> Dict[str, Any]:
+        # LSU entries also get the title/code/department keys Brown courses use
+        course = {**doc.metadata, "content": doc.page_content}
+        if "Num" in course:
+            course.setdefault("title", course.get("Name", ""))
+            course.setdefault("code", course["Num"])
+            course.setdefault("department", course.get("Dept", ""))
+        return course
+
+    @classmethod
+    def _matches_filters(cls, doc: Document, body_search: str = None, allowed_sections: set = None,
+                         doc_types: List[str] = None) -> bool:
+        if allowed_sections is not None and meeting_key(doc.metadata) not in allowed_sections:
+            return False
+        if doc_types and cls._document_type(doc.metadata) not in doc_types:
+            return False
+        if body_search:
+            content = doc.page_content.lower()
+            return all(term in content for term in body_search.lower().split())
+        return True
+
+    def _retrieve(self, question: str, k: int = None, body_search: str = None,
+                  allowed_sections: set = None, graph_result: Dict[str, Any] = None,
+                  doc_types: List[str] = None, shards: List[Shard] = None,
+                  query_vector: np.ndarray = None,
+                  pool: Tuple[List[CandidateRef], np.ndarray] = None,
+                  index: IndexVersion = None) -> List[Document]:
+        # Everything below reads the version the caller pinned, never a newer one swapped in meanwhile
+        index = index or self.index
+        k = k or self.config.RETRIEVER_K
+        shards = shards if shards is not None else self.route_shards(question, index=index)
+        if query_vector is None:
+            query_vector = self._embed_query(question)
+
+        # Fan out over the shards once for the widest pool; filtered queries look further down the list
+        filtered = allowed_sections is not None or bool(body_search) or bool(doc_types)
+        max_fetch_k = self.config.RETRIEVER_FETCH_K_MAX
+        if filtered:
+            max_fetch_k *= self.config.FILTERED_FETCH_MULTIPLIER
+        if pool is None:
+            refs, vectors, scores = index.shards.search(query_vector, max_fetch_k, shards)
+        else:
+            # A session's candidate pool: rescore against this query instead of searching again
+            refs, vectors = pool
+            scores = cosine_scores(query_vector, vectors)
+            order = np.argsort(-scores, kind="stable")
+            refs, vectors, scores = [refs[i] for i in order], vectors[order], scores[order]
+        if filtered:
+            keep = np.array([
+                self._matches_filters(shard.document_at(p), body_search, allowed_sections, doc_types)
+                for shard, p in refs
+            ], dtype=bool)
+            refs = [ref for ref, kept in zip(refs, keep) if kept]
+            vectors, scores = vectors[keep], scores[keep]
+
+        # Candidates arrive best-first: size fetch_k to the score distribution, then run MMR on that pool
+        fetch_k = adaptive_fetch_k(
+            scores, k, self.config.RETRIEVER_FETCH_K, max_fetch_k, self.config.FETCH_SCORE_MARGIN
+        )
+        selected, relevance = maximal_marginal_relevance(
+            query_vector, vectors[:fetch_k], k,
+            lambda_mult=self.config.MMR_LAMBDA,
+            min_gain=self.config.MMR_MIN_GAIN,
+            min_k=self.config.MMR_MIN_K,
+        )
+        ranked = [(refs[i], float(relevance[i])) for i in selected]
 
-        logging.info("Creating new vector store from documents...")
-        documents = self._load_documents()
-        vector_store = FAISS.from_documents(documents=documents, embedding=self.embeddings)
-        os.makedirs(self.config.DATABASE_PATH, exist_ok=True)
-        vector_store.save_local(self.config.DATABASE_PATH)
-        logging.info("Vector store saved locally.")
-        return vector_store
+        # Put prerequisite-graph neighbours ahead of the semantic hits
+        if graph_result:
+            boost = [
+                (shard, p) for shard, p in self._graph_refs(graph_result, shards)
+                if self._matches_filters(shard.document_at(p), None, allowed_sections, doc_types)
+            ]
+            boost_scores = cosine_scores(query_vector, index.shards.vectors_for(boost))
+            seen = set(boost)
+            ranked = list(zip(boost, boost_scores.tolist())) + [r for r in ranked if r[0] not in seen]
+            ranked = ranked[:k]
+
+        logging.info(f"MMR selected {len(ranked)} of {fetch_k} candidates "
+                     f"(pool {len(refs)} from {len(shards)} shards).")
+        return [self._scored_document(ref, score) for ref, score in ranked]
+
+    def _embed_query(self, question: str, deadline: Deadline = None) -> np.ndarray:
+        if deadline is None:
+            return np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        # Hedged: a second request goes out if the first is slow; the first to return wins
+        embedding = hedged_call(
+            self._embed_pool,
+            lambda: self.embeddings.embed_query(question),
+            deadline.stage(self.config.EMBED_TIMEOUT_S),
+            "embedding",
+            hedge_after=self.config.EMBED_HEDGE_AFTER_S,
+            max_attempts=self.config.EMBED_MAX_ATTEMPTS
+        )
+        return np.asarray(embedding, dtype=np.float32)
+
+    def _fallback_answer(self, docs: List[Document], graph_result: Dict[str, Any] = None) -> str:
+        """Deterministic answer rendered from the retrieved metadata, used when the LLM is unavailable."""
+        lines = ["The course advisor could not write a summary in time, so here are the best-matching courses "
+                 "from the catalog, most relevant first:"]
+        if graph_result:
+            lines.append(f"\n{self._describe_graph_result(graph_result)}\n")
+        courses = [doc.metadata for doc in docs if self._document_type(doc.metadata) == "course"]
+        for meta in courses[:self.config.FALLBACK_MAX_COURSES]:
+            title = meta.get("title") or meta.get("Name") or "Untitled"
+            code = meta.get("code") or f"{meta.get('Dept', '')} {meta.get('Num', '')}".strip()
+            details = [meta.get("department") or meta.get("Dept"), meta.get("professor"), meta.get("time")]
+            detail_str = " | ".join(str(d) for d in details if d)
+            lines.append(f"- **{title}** ({code})" + (f": {detail_str}" if detail_str else ""))
+        if not courses:
+            lines.append("*No exact match found.*")
+        return "\n".join(lines)
 
     def _create_prompt_template(self) -> PromptTemplate:
         template = """
@@ -184,72 +821,323 @@ class RAGBackend:
         return PromptTemplate.from_template(template)
 
 
-    def get_response(self, question: str, body_search: str = None) -> Dict[str, Any]:
-        start_time = time.time()
-        logging.info(f"Query received: {question}")
+    @staticmethod
+    def _request_key(question: str, body_search: str = None, meeting_filter: str = None,
+                     avoid_schedule: List[str] = None, doc_types: List[str] = None,
+                     universities: List[str] = None, sources: List[str] = None) -> Tuple:
+        # Whitespace-insensitive; case is kept because university routing is case-sensitive
+        def text(value: str) -> str:
+            return " ".join(value.split()) if value else ""
 
-        try:
-            # Prepare search kwargs for hybrid search
-            search_kwargs = {}
-            if body_search:
-                search_kwargs["body_search"] = body_search
-
-            # Perform MMR search with hybrid keyword
-            docs = self.vector_store.max_marginal_relevance_search(
-                query=question,
-                k=self.config.RETRIEVER_K,
-                fetch_k=self.config.RETRIEVER_FETCH_K,
-                search_kwargs=search_kwargs 
+        def items(values: List[str]) -> Tuple[str, ...]:
+            return tuple(sorted({text(v) for v in values or [] if text(v)}))
+
+        return (
+            text(question), text(body_search).lower(), text(meeting_filter),
+            items(avoid_schedule), items(doc_types), items(universities), items(sources),
+        )
+
+    def get_response(self, question: str, body_search: str = None,
+                     meeting_filter: str = None, avoid_schedule: List[str] = None,
+                     doc_types: List[str] = None, universities: List[str] = None,
+                     sources: List[str] = None, session_id: str = None,
+                     deadline: Deadline = None) -> Dict[str, Any]:
+        """
+        Answer a question. Concurrent identical requests (same normalized question
+        and filters) share one retrieval and LLM call; if that call fails, every
+        waiting caller gets the error. With a ``session_id``, follow-up questions
+        re-rank and filter the session's previous candidates instead of searching
+        the whole corpus again. Pass a ``deadline`` started when the request
+        arrived so time spent queued counts against the budget; by default it
+        starts now.
+        """
+        key = (session_id,) + self._request_key(question, body_search, meeting_filter, avoid_schedule,
+                                                doc_types, universities, sources)
+        result = self._inflight.do(key, lambda: self._answer(
+            question, body_search, meeting_filter, avoid_schedule, doc_types, universities, sources, session_id,
+            deadline
+        ))
+        # Coalesced callers share one result; give each its own top-level dict
+        return {**result, "retrieved_courses": list(result["retrieved_courses"])}
+
+    def retrieve(self, question: str, body_search: str = None,
+                 meeting_filter: str = None, avoid_schedule: List[str] = None,
+                 doc_types: List[str] = None, universities: List[str] = None,
+                 sources: List[str] = None, session_id: str = None,
+                 deadline: Deadline = None) -> Dict[str, Any]:
+        """
+        Retrieval only, no LLM call: the ranked ``documents``, the course entries
+        among them (``retrieved_courses``) and the ``prerequisite_graph`` answer
+        (or None). Pass the result to summarize() to generate an answer later.
+        Coalesced and session-aware like get_response.
+        """
+        key = ("retrieve", session_id) + self._request_key(question, body_search, meeting_filter, avoid_schedule,
+                                                doc_types, universities, sources)
+
+        def run() -> Dict[str, Any]:
+            logging.info(f"Retrieval query received: {question}")
+            try:
+                return self._search(question, body_search, meeting_filter, avoid_schedule, doc_types,
+                                    universities, sources, deadline or Deadline(self.config.REQUEST_DEADLINE_S),
+                                    session_id)
+            except DeadlineExceeded as e:
+                logging.error(f"Query deadline exceeded: {str(e)}")
+                raise
+            except Exception as e:
+                logging.error(f"Error processing query: {str(e)}")
+                raise ValueError(f"Error processing query: {str(e)}")
+
+        result = self._inflight.do(key, run)
+        return {**result, "documents": list(result["documents"]),
+                "retrieved_courses": list(result["retrieved_courses"])}
+
+    def summarize(self, retrieval: Dict[str, Any], deadline: Deadline = None) -> Dict[str, Any]:
+        """Generate the answer for a retrieve() result: {"answer": ...}, plus "degraded" on fallback."""
+        answer, degraded = self._generate(retrieval, deadline or Deadline(self.config.REQUEST_DEADLINE_S))
+        return {"answer": answer, "degraded": degraded} if degraded else {"answer": answer}
+
+    def coalescing_stats(self) -> Dict[str, int]:
+        """Calls seen, executed and coalesced (deduplicated) by get_response, plus failures fanned out."""
+        return self._inflight.stats()
+
+    def end_session(self, session_id: str) -> None:
+        self.sessions.discard(session_id)
+
+    def _is_follow_up(self, session: RetrievalSession, question: str, query_vector: np.ndarray) -> bool:
+        """Whether ``question`` refines the session's topic rather than starting a new one."""
+        if FOLLOW_UP_QUERY_RE.search(question):
+            return True
+        similarity = float(cosine_scores(session.topic_vector, query_vector.reshape(1, -1))[0])
+        return similarity >= self.config.FOLLOW_UP_MIN_SIMILARITY
+
+    @staticmethod
+    def _has_prerequisites(doc: Document, graph: PrerequisiteGraph) -> bool:
+        key = course_key(doc.metadata)
+        return key is None or bool(graph.prerequisites(key[1], school=key[0]))
+
+    def _session_pool(self, session: RetrievalSession, query_vector: np.ndarray, shards: List[Shard],
+                      index: IndexVersion, k: int, body_search: str, allowed_sections: set,
+                      doc_types: List[str]) -> Tuple[List[CandidateRef], np.ndarray]:
+        """
+        The session's candidates that satisfy every filter. If fewer than ``k``
+        survive, search twice as deep (up to SESSION_POOL_MAX) and add the new
+        candidates to the pool.
+        """
+        names = {shard.name for shard in shards}
+
+        def keep(ref: CandidateRef) -> bool:
+            shard, position = ref
+            if shard.name not in names:
+                return False
+            doc = shard.document_at(position)
+            if session.no_prerequisites and self._has_prerequisites(doc, index.prereq_graph):
+                return False
+            return self._matches_filters(doc, body_search, allowed_sections, doc_types)
+
+        while True:
+            kept = [i for i, ref in enumerate(session.refs) if keep(ref)]
+            if len(kept) >= k or session.fetch_k >= self.config.SESSION_POOL_MAX:
+                break
+            fetch_k = min(session.fetch_k * 2, self.config.SESSION_POOL_MAX)
+            refs, vectors, _ = index.shards.search(query_vector, fetch_k, shards)
+            session.merge(refs, vectors, fetch_k)
+            logging.info(f"Session pool expanded to {len(session)} candidates (fetch_k {fetch_k}).")
+        return [session.refs[i] for i in kept], session.vectors[kept]
+
+    def _session_candidates(self, session_id: str, question: str, query_vector: np.ndarray,
+                            shards: List[Shard], index: IndexVersion, body_search: str, meeting_filter: str,
+                            avoid_schedule: List[str], doc_types: List[str], meets_on: bool,
+                            no_prerequisites: bool
+                            ) -> Tuple[np.ndarray, List[Shard], set, Tuple[List[CandidateRef], np.ndarray], Dict[str, Any]]:
+        """
+        The session part of a search: refine the session (or start one for a new
+        topic) and take its filtered candidate pool. Everything runs under the
+        session's lock, so concurrent questions on one session apply in turn.
+        Returns the query vector and shards to use, the allowed sections, the
+        pool and the session summary for the response.
+        """
+        session = self.sessions.get(session_id)
+        if session is not None and session.index_name == index.name:
+            with session.lock:
+                # A follow-up refines the session's topic and inherits its earlier refinements
+                if self._is_follow_up(session, question, query_vector):
+                    session.topic_vector = normalize_rows(
+                        session.topic_vector + self.config.FOLLOW_UP_QUERY_WEIGHT * normalize_rows(query_vector)
+                    )
+                    session.turns += 1
+                    shards = [shard for shard in shards if shard.name in session.shard_names] or shards
+                    return self._refine_session(session, session_id, question, session.topic_vector, shards, index,
+                                                body_search, meeting_filter, avoid_schedule, doc_types,
+                                                meets_on, no_prerequisites)
+
+        # New topic: one full search, kept as the session's candidate pool for follow-ups
+        filtered = bool(meeting_filter or avoid_schedule or body_search or doc_types or meets_on or no_prerequisites)
+        fetch_k = self.config.RETRIEVER_FETCH_K_MAX
+        if filtered:
+            fetch_k *= self.config.FILTERED_FETCH_MULTIPLIER
+        refs, vectors, _ = index.shards.search(query_vector, fetch_k, shards)
+        session = RetrievalSession(index.name, normalize_rows(query_vector), refs, vectors, fetch_k,
+                                   shard_names={shard.name for shard in shards})
+        with session.lock:
+            # Not kept if the index was swapped meanwhile: it would pin the old version in memory
+            if index is self.index:
+                self.sessions.put(session_id, session)
+            return self._refine_session(session, session_id, question, query_vector, shards, index,
+                                        body_search, meeting_filter, avoid_schedule, doc_types,
+                                        meets_on, no_prerequisites)
+
+    def _refine_session(self, session: RetrievalSession, session_id: str, question: str,
+                        query_vector: np.ndarray, shards: List[Shard], index: IndexVersion, body_search: str,
+                        meeting_filter: str, avoid_schedule: List[str], doc_types: List[str], meets_on: bool,
+                        no_prerequisites: bool
+                        ) -> Tuple[np.ndarray, List[Shard], set, Tuple[List[CandidateRef], np.ndarray], Dict[str, Any]]:
+        # Caller holds session.lock
+        if meets_on:
+            session.meets_on.append(question)
+        session.no_prerequisites |= no_prerequisites
+
+        # Restrict candidates to sections matching the meeting-time constraints
+        allowed_sections = self.find_sections(meeting_filter, avoid_schedule, shards, session.meets_on)
+        pool = self._session_pool(session, query_vector, shards, index, self.config.RETRIEVER_K,
+                                  body_search, allowed_sections, doc_types)
+        session_info = {
+            "id": session_id,
+            "follow_up": session.turns > 1,
+            "turn": session.turns,
+            "pool_size": len(session),
+        }
+        return query_vector, shards, allowed_sections, pool, session_info
+
+    def _search(self, question: str, body_search: str, meeting_filter: str, avoid_schedule: List[str],
+                doc_types: List[str], universities: List[str], sources: List[str],
+                deadline: Deadline, session_id: str = None) -> Dict[str, Any]:
+        # Pin one index version for the whole request, then pick the shards it needs
+        self._maybe_follow_current_version()
+        index = self.index
+        shards = self.route_shards(question, universities, sources, index=index)
+
+        # Boost prerequisite-graph neighbours for "unlocks/requires" questions
+        graph_result = self.answer_prerequisite_query(question, index=index)
+
+        # Embed the question within its share of the request budget
+        query_vector = self._embed_query(question, deadline)
+
+        # Day and no-prerequisite constraints stated in this question
+        meets_on = parse_question_window(question) is not None
+        no_prerequisites = bool(NO_PREREQ_QUERY_RE.search(question))
+
+        if session_id:
+            query_vector, shards, allowed_sections, pool, session_info = self._session_candidates(
+                session_id, question, query_vector, shards, index, body_search, meeting_filter,
+                avoid_schedule, doc_types, meets_on, no_prerequisites
             )
+        else:
+            # Restrict candidates to sections matching the meeting-time constraints
+            allowed_sections = self.find_sections(meeting_filter, avoid_schedule, shards)
+            pool, session_info = None, None
 
-            # Embed query
-            query_embedding = self.embeddings.embed_query(question)
+        # Perform MMR search with hybrid keyword; scores come from the stored vectors
+        docs = self._retrieve(
+            question,
+            body_search=body_search,
+            allowed_sections=allowed_sections,
+            graph_result=graph_result,
+            doc_types=doc_types,
+            shards=shards,
+            query_vector=query_vector,
+            pool=pool,
+            index=index
+        )
 
-            # Embed retrieved documents
-            doc_contents = [doc.page_content for doc in docs]
-            doc_embeddings = self.embeddings.embed_documents(doc_contents)
+        # Log retrieved documents & scores
+        logging.info("Retrieved Documents:")
+        for doc in docs:
+            score = doc.metadata.get('score', 'N/A')
+            logging.info(f"- Source: {doc.metadata.get('source', 'unknown')} | Page: {doc.metadata.get('page', 'N/A')} | Score: {score}")
 
-            # Compute cosine similarities and add to metadata
-            for i, doc in enumerate(docs):
-                q_norm = np.linalg.norm(query_embedding)
-                d_norm = np.linalg.norm(doc_embeddings[i])
-                sim = 0.0 if q_norm == 0 or d_norm == 0 else np.dot(query_embedding, doc_embeddings[i]) / (q_norm * d_norm)
-                doc.metadata['score'] = sim
+        # Prepare retrieved courses (Brown sections, LSU catalog entries and bulletin course entries)
+        retrieved_courses = [
+            self._course_entry(doc) for doc in docs if self._document_type(doc.metadata) == "course"
+        ]
+        result = {
+            "question": question,
+            "documents": docs,
+            "retrieved_courses": retrieved_courses,
+            "prerequisite_graph": graph_result,
+        }
+        if session_info is not None:
+            result["session"] = session_info
+        return result
 
-            # Log retrieved documents & scores
-            logging.info("Retrieved Documents:")
-            for doc in docs:
-                score = doc.metadata.get('score', 'N/A')
-                logging.info(f"- Source: {doc.metadata.get('source', 'unknown')} | Page: {doc.metadata.get('page', 'N/A')} | Score: {score}")
+    def _generate(self, retrieval: Dict[str, Any], deadline: Deadline) -> Tuple[str, str]:
+        # Returns (answer, degraded reason or None); never raises for LLM failures
+        docs, graph_result = retrieval["documents"], retrieval["prerequisite_graph"]
 
-            # Build context from retrieved docs including metadata
-            context_parts = []
-            for doc in docs:
-                meta_str = "Metadata:\n" + "\n".join([f"{k}: {v}" for k, v in doc.metadata.items()])
-                context_parts.append(meta_str + "\nContent:\n" + doc.page_content)
-            context = "\n\n---\n\n".join(context_parts)
+        # Build context from retrieved docs including metadata
+        context_parts = []
+        for doc in docs:
+            meta_str = "Metadata:\n" + "\n".join([f"{k}: {v}" for k, v in doc.metadata.items()])
+            context_parts.append(meta_str + "\nContent:\n" + doc.page_content)
+        if graph_result:
+            context_parts.insert(0, "Prerequisite graph:\n" + self._describe_graph_result(graph_result))
+        context = "\n\n---\n\n".join(context_parts)
 
-            # Format prompt
-            input_dict = {"context": context, "question": question}
-            prompt = self.prompt_template.format(**input_dict)
+        # Format prompt
+        input_dict = {"context": context, "question": retrieval["question"]}
+        prompt = self.prompt_template.format(**input_dict)
 
-            # Invoke LLM
-            response = self.llm.invoke(prompt).content
+        # Invoke LLM with whatever budget is left; fall back to the template answer if it can't finish
+        llm_budget = deadline.stage(self.config.LLM_TIMEOUT_S)
+        if llm_budget < self.config.LLM_MIN_BUDGET_S:
+            return self._fallback_answer(docs, graph_result), "deadline"
+        try:
+            response = call_with_timeout(
+                self._llm_pool, lambda: self.llm.invoke(prompt).content, llm_budget, "LLM generation"
+            )
+            return response, None
+        except DeadlineExceeded as e:
+            logging.warning(f"{str(e)}; answering from retrieved metadata.")
+            return self._fallback_answer(docs, graph_result), "llm_timeout"
+        except Exception as e:
+            logging.error(f"LLM generation failed: {str(e)}; answering from retrieved metadata.")
+            return self._fallback_answer(docs, graph_result), "llm_error"
 
-            elapsed_time = time.time() - start_time
-            logging.info(f"Response time: {elapsed_time:.2f}s")
+    def _answer(self, question: str, body_search: str = None,
+                meeting_filter: str = None, avoid_schedule: List[str] = None,
+                doc_types: List[str] = None, universities: List[str] = None,
+                sources: List[str] = None, session_id: str = None,
+                deadline: Deadline = None) -> Dict[str, Any]:
+        start_time = time.time()
+        deadline = deadline or Deadline(self.config.REQUEST_DEADLINE_S)
+        queued = deadline.elapsed()
+        logging.info(f"Query received: {question}")
 
-            # Prepare retrieved courses (filter to those with 'code')
-            retrieved_courses = [
-                {**doc.metadata, "content": doc.page_content}
-                for doc in docs if "code" in doc.metadata
-            ]
+        try:
+            retrieval = self._search(question, body_search, meeting_filter, avoid_schedule,
+                                     doc_types, universities, sources, deadline, session_id)
+            retrieved_at = deadline.elapsed()
+            response, degraded = self._generate(retrieval, deadline)
 
-            return {
+            elapsed_time = time.time() - start_time
+            logging.info(f"Response time: {elapsed_time:.2f}s (queued {queued:.2f}s, retrieval done at {retrieved_at:.2f}s"
+                         f"{', degraded: ' + degraded if degraded else ''})")
+
+            result = {
                 "answer": response,
-                "retrieved_courses": retrieved_courses
+                "retrieved_courses": retrieval["retrieved_courses"]
             }
+            if retrieval["prerequisite_graph"]:
+                result["prerequisite_graph"] = retrieval["prerequisite_graph"]
+            if "session" in retrieval:
+                result["session"] = retrieval["session"]
+            if degraded:
+                result["degraded"] = degraded
+            return result
 
+        except DeadlineExceeded as e:
+            # Nothing retrieved in time (the embedding call is the only remote step before the LLM)
+            logging.error(f"Query deadline exceeded: {str(e)}")
+            raise
         except Exception as e:
             logging.error(f"Error processing query: {str(e)}")
             raise ValueError(f"Error processing query: {str(e)}")
@@ -269,23 +1157,8 @@ class RAGBackend:
         for item in labeled_set:
             start_time = time.time()
 
-            # Retrieve documents from FAISS
-            docs = self.vector_store.max_marginal_relevance_search(
-                query=item["query"],
-                k=self.config.RETRIEVER_K,
-                fetch_k=self.config.RETRIEVER_FETCH_K
-            )
-
-            # Compute similarity scores manually
-            query_embedding = self.embeddings.embed_query(item["query"])
-            doc_contents = [doc.page_content for doc in docs]
-            doc_embeddings = self.embeddings.embed_documents(doc_contents)
-
-            for i, doc in enumerate(docs):
-                q_norm = np.linalg.norm(query_embedding)
-                d_norm = np.linalg.norm(doc_embeddings[i])
-                sim = np.dot(query_embedding, doc_embeddings[i]) / (q_norm * d_norm) if q_norm != 0 and d_norm != 0 else 0.0
-                doc.metadata['score'] = float(sim)  # ✅ Convert to native float to avoid JSON serialization issues
+            # Retrieve documents from FAISS (scores are native floats from the stored vectors)
+            docs = self._retrieve(item["query"])
 
             latency = time.time() - start_time
 
@@ -0,0 +1,108 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class RetrievalSession:
+    """
+    What a conversation has retrieved so far: the candidate pool (refs into the
+    shards of one index version, with their vectors), the running topic vector,
+    and the refinements accumulated from follow-up questions. Hold ``lock``
+    while reading or updating any of them.
+    """
+
+    def __init__(self, index_name: str, topic_vector: np.ndarray, refs: list,
+                 vectors: np.ndarray, fetch_k: int, shard_names: set = None):
+        self.index_name = index_name
+        self.topic_vector = topic_vector
+        self.refs = refs
+        self.vectors = vectors
+        self.fetch_k = fetch_k
+        self.shard_names = shard_names or set()
+        self.meets_on: List[str] = []
+        self.no_prerequisites = False
+        self.turns = 1
+        self.touched_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def merge(self, refs: list, vectors: np.ndarray, fetch_k: int) -> None:
+        """Add the candidates of a deeper search that are not in the pool yet."""
+        seen = set(self.refs)
+        new = [i for i, ref in enumerate(refs) if ref not in seen]
+        if new:
+            # Swap both at once so refs and vectors always line up
+            self.refs, self.vectors = (
+                self.refs + [refs[i] for i in new],
+                np.vstack([self.vectors, vectors[new]]) if len(self.vectors) else vectors[new],
+            )
+        self.fetch_k = fetch_k
+
+
+class SessionStore:
+    """Thread-safe LRU of retrieval sessions; sessions idle for longer than ``ttl_s`` expire."""
+
+    def __init__(self, max_sessions: int, ttl_s: float):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, RetrievalSession]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+
+    def _expire(self, now: float) -> None:
+        # Oldest first, so stop at the first session still inside the TTL
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.touched_at < self.ttl_s:
+                break
+            del self._sessions[session_id]
+            self._stats["expired"] += 1
+
+    def get(self, session_id: str) -> Optional[RetrievalSession]:
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._stats["misses"] += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            session.touched_at = now
+            self._stats["hits"] += 1
+            return session
+
+    def put(self, session_id: str, session: RetrievalSession) -> None:
+        with self._lock:
+            now = time.monotonic()
+            session.touched_at = now
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            self._expire(now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats["evicted"] += 1
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def retain_index(self, index_name: str) -> int:
+        """
+        Drop sessions built on any other index version (their refs would keep
+        that version's shards in memory); returns how many were dropped.
+        """
+        with self._lock:
+            stale = [sid for sid, session in self._sessions.items() if session.index_name != index_name]
+            for session_id in stale:
+                del self._sessions[session_id]
+            self._stats["invalidated"] += len(stale)
+            return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "active": len(self._sessions)}
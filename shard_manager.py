@@ -0,0 +1,251 @@
+import os
+import json
+import shutil
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+import numpy as np
+from langchain.schema import Document
+from langchain.vectorstores import FAISS
+
+from meeting_times import MeetingTimeIndex
+from mmr import cosine_scores
+from prereq_graph import course_key
+from quantization import build_compressed_index, project
+
+
+MEETING_INDEX_FILE = "meeting_index.npz"
+COMPRESSION_FILE = "compression.json"
+FULL_VECTORS_FILE = "full_vectors.npy"
+
+
+class ShardSpec:
+    """One independently built index: a university x term catalog or a single document."""
+
+    def __init__(self, name: str, university: str, source_path: str,
+                 loader: Callable[[str], List[Document]], term: str = None):
+        self.name = name
+        self.university = university
+        self.source_path = source_path
+        self.loader = loader
+        self.term = term
+
+    @property
+    def source(self) -> str:
+        return os.path.basename(self.source_path)
+
+
+class Shard:
+    """
+    A loaded FAISS store plus the per-shard lookup tables built from its documents.
+
+    A compressed shard searches a float16/int8 and/or dimension-reduced index
+    (``compression``), over-fetches by ``rescore_oversample`` and returns the
+    full-precision vectors from ``full_vectors`` (memory-mapped from disk), so
+    the global merge and MMR rescore candidates exactly.
+    """
+
+    def __init__(self, spec: ShardSpec, store: FAISS, meeting_index: MeetingTimeIndex,
+                 compression: Dict[str, Any] = None, full_vectors: np.ndarray = None,
+                 rescore_oversample: int = 1):
+        self.spec = spec
+        self.store = store
+        self.meeting_index = meeting_index
+        self.compression = compression
+        self.full_vectors = full_vectors
+        self.rescore_oversample = rescore_oversample if compression else 1
+        self.positions_by_course: Dict[Tuple[str, str], List[int]] = {}
+        for position in range(store.index.ntotal):
+            key = course_key(self.document_at(position).metadata)
+            if key:
+                self.positions_by_course.setdefault(key, []).append(position)
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    def __len__(self) -> int:
+        return self.store.index.ntotal
+
+    def document_at(self, position: int) -> Document:
+        return self.store.docstore.search(self.store.index_to_docstore_id[int(position)])
+
+    def vectors_at(self, positions: np.ndarray) -> np.ndarray:
+        positions = np.asarray(positions, dtype=np.int64)
+        if self.full_vectors is not None:
+            return np.asarray(self.full_vectors[positions], dtype=np.float32)
+        if len(positions) == 0:
+            return np.zeros((0, self.store.index.d), dtype=np.float32)
+        return self.store.index.reconstruct_batch(positions)
+
+    def search(self, query_vector: np.ndarray, fetch_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Nearest neighbours plus their full-precision vectors for exact rescoring
+        fetch_k = min(fetch_k * self.rescore_oversample, len(self))
+        if fetch_k <= 0:
+            return np.zeros(0, dtype=np.int64), self.vectors_at(np.zeros(0, dtype=np.int64))
+        query = query_vector.reshape(1, -1)
+        if self.compression:
+            query = project(query, self.compression.get("dimensions"))
+        _, ids = self.store.index.search(query, fetch_k)
+        positions = ids[0][ids[0] >= 0].astype(np.int64)
+        return positions, self.vectors_at(positions)
+
+    def compressed(self, quantization: str = None, dimensions: int = None, rescore_oversample: int = 1) -> "Shard":
+        """In-memory compressed copy of an uncompressed shard (used to measure recall deltas)."""
+        full_vectors = self.store.index.reconstruct_n(0, len(self))
+        store = FAISS(
+            embedding_function=self.store.embedding_function,
+            index=build_compressed_index(full_vectors, quantization, dimensions),
+            docstore=self.store.docstore,
+            index_to_docstore_id=self.store.index_to_docstore_id,
+        )
+        compression = {"quantization": quantization, "dimensions": dimensions}
+        return Shard(self.spec, store, self.meeting_index, compression, full_vectors, rescore_oversample)
+
+
+# A retrieval candidate: the shard it came from and its position in that shard's index
+CandidateRef = Tuple[Shard, int]
+
+
+class ShardManager:
+    """
+    Keeps one FAISS index per ShardSpec under ``<root>/<shard name>/``. Shards
+    build and load independently (missing ones are built, present ones loaded);
+    queries are routed to a subset of shards and fanned out over a thread pool
+    with a global top-k merge. Swapping in rebuilt shards happens one level up,
+    by replacing the whole index version (see index_versions.py).
+    """
+
+    def __init__(self, root: str, specs: List[ShardSpec], embeddings, max_workers: int = 4,
+                 quantization: str = None, dimensions: int = None, rescore_oversample: int = 1):
+        self.root = root
+        self.specs = {spec.name: spec for spec in specs}
+        self.embeddings = embeddings
+        self.quantization = quantization
+        self.dimensions = dimensions
+        self.rescore_oversample = rescore_oversample
+        self.shards: Dict[str, Shard] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard")
+
+    # ---------- build / load ----------
+
+    def shard_path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _has_index(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.shard_path(name), "index.faiss"))
+
+    def _load_shard(self, spec: ShardSpec) -> Shard:
+        path = self.shard_path(spec.name)
+        store = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+        meeting_file = os.path.join(path, MEETING_INDEX_FILE)
+        if os.path.exists(meeting_file):
+            meeting_index = MeetingTimeIndex.load(meeting_file)
+        else:
+            meeting_index = MeetingTimeIndex.from_metadata(
+                store.docstore.search(doc_id).metadata for doc_id in store.index_to_docstore_id.values()
+            )
+            meeting_index.save(meeting_file)
+
+        # Compression is a property of the build, not of the current config
+        compression, full_vectors = None, None
+        compression_file = os.path.join(path, COMPRESSION_FILE)
+        if os.path.exists(compression_file):
+            with open(compression_file, "r", encoding="utf-8") as f:
+                compression = json.load(f)
+            full_vectors = np.load(os.path.join(path, FULL_VECTORS_FILE), mmap_mode="r")
+        return Shard(spec, store, meeting_index, compression, full_vectors, self.rescore_oversample)
+
+    def _build_shard(self, spec: ShardSpec) -> Optional[Shard]:
+        if not os.path.exists(spec.source_path):
+            return None
+        documents = spec.loader(spec.source_path)
+        if not documents:
+            logging.info(f"Shard {spec.name}: no documents in {spec.source_path}, skipping.")
+            return None
+
+        logging.info(f"Shard {spec.name}: embedding {len(documents)} documents...")
+        store = FAISS.from_documents(documents=documents, embedding=self.embeddings)
+        meeting_index = MeetingTimeIndex.from_metadata(doc.metadata for doc in documents)
+        compression, full_vectors = None, None
+        if self.quantization or self.dimensions:
+            compression = {"quantization": self.quantization, "dimensions": self.dimensions}
+            full_vectors = store.index.reconstruct_n(0, store.index.ntotal)
+            store.index = build_compressed_index(full_vectors, self.quantization, self.dimensions)
+
+        # Write next to the live shard and rename into place so loaders never see a partial index
+        path = self.shard_path(spec.name)
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        store.save_local(tmp_path)
+        meeting_index.save(os.path.join(tmp_path, MEETING_INDEX_FILE))
+        if compression:
+            np.save(os.path.join(tmp_path, FULL_VECTORS_FILE), full_vectors)
+            with open(os.path.join(tmp_path, COMPRESSION_FILE), "w", encoding="utf-8") as f:
+                json.dump(compression, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        logging.info(f"Shard {spec.name} saved to {path}.")
+        if compression:
+            full_vectors = np.load(os.path.join(path, FULL_VECTORS_FILE), mmap_mode="r")
+        return Shard(spec, store, meeting_index, compression, full_vectors, self.rescore_oversample)
+
+    def _load_or_build(self, spec: ShardSpec, build_missing: bool = True) -> Optional[Shard]:
+        if self._has_index(spec.name):
+            logging.info(f"Loading shard {spec.name}...")
+            return self._load_shard(spec)
+        if not build_missing:
+            # Serving a prebuilt artifact: it is authoritative about which shards exist
+            logging.info(f"Shard {spec.name} is not in {self.root}, skipping.")
+            return None
+        return self._build_shard(spec)
+
+    def load_all(self, build_missing: bool = True) -> None:
+        loaded = self._executor.map(lambda spec: self._load_or_build(spec, build_missing), self.specs.values())
+        self.shards = {shard.name: shard for shard in loaded if shard is not None}
+        logging.info(f"Loaded {len(self.shards)} shards: {', '.join(sorted(self.shards))}")
+
+    # ---------- query ----------
+
+    def route(self, universities: List[str] = None, sources: List[str] = None) -> List[Shard]:
+        """Pick the shards matching the query filters; no filter means every shard."""
+        shards = list(self.shards.values())
+        if universities:
+            wanted = {u.lower() for u in universities}
+            shards = [s for s in shards if s.spec.university.lower() in wanted]
+        if sources:
+            wanted = set(sources)
+            shards = [s for s in shards if s.spec.source in wanted or s.name in wanted]
+        return shards
+
+    def search(self, query_vector: np.ndarray, fetch_k: int,
+               shards: List[Shard]) -> Tuple[List[CandidateRef], np.ndarray, np.ndarray]:
+        """
+        Search every shard in parallel and merge to the global top ``fetch_k`` by
+        cosine score. Returns candidate refs, their vectors and scores, best first.
+        """
+        futures = [self._executor.submit(shard.search, query_vector, fetch_k) for shard in shards]
+        refs: List[CandidateRef] = []
+        matrices: List[np.ndarray] = []
+        for shard, future in zip(shards, futures):
+            positions, vectors = future.result()
+            refs.extend((shard, int(p)) for p in positions)
+            matrices.append(vectors)
+        if not refs:
+            return [], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+        matrix = np.vstack(matrices)
+        scores = cosine_scores(query_vector, matrix)
+        top = np.arange(len(scores))
+        if len(scores) > fetch_k:
+            top = np.argpartition(-scores, fetch_k)[:fetch_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [refs[i] for i in top], matrix[top], scores[top]
+
+    def vectors_for(self, refs: List[CandidateRef]) -> np.ndarray:
+        rows = [shard.vectors_at(np.array([position], dtype=np.int64)) for shard, position in refs]
+        if not rows:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(rows)
@@ -0,0 +1,126 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from deadlines import Deadline, DeadlineExceeded, call_with_timeout, hedged_call
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+@pytest.fixture
+def release():
+    # Unblocks calls a test abandoned so the executor can shut down
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_deadline_stage_is_clipped_to_what_remains():
+    deadline = Deadline(0.2)
+    assert deadline.stage(5.0) <= 0.2
+    assert deadline.stage(0.05) == 0.05
+    time.sleep(0.25)
+    assert deadline.remaining() == 0.0
+    assert deadline.stage(1.0) == 0.0
+
+
+def test_call_with_timeout_returns_result(executor):
+    assert call_with_timeout(executor, lambda: "done", 1.0, "stage") == "done"
+
+
+def test_call_with_timeout_raises_when_budget_runs_out(executor, release):
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded, match="LLM generation timed out"):
+        call_with_timeout(executor, lambda: release.wait(2), 0.1, "LLM generation")
+    assert time.monotonic() - start < 0.5
+
+
+def test_call_with_timeout_without_budget_does_not_submit(executor):
+    calls = []
+    with pytest.raises(DeadlineExceeded, match="No time left"):
+        call_with_timeout(executor, lambda: calls.append(1), 0.0, "embedding")
+    assert calls == []
+
+
+def test_call_with_timeout_propagates_errors(executor):
+    def fail():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError, match="bad request"):
+        call_with_timeout(executor, fail, 1.0, "stage")
+
+
+def test_fast_call_is_not_hedged(executor):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return "fast"
+
+    assert hedged_call(executor, fn, 1.0, "embedding", hedge_after=0.2, max_attempts=2) == "fast"
+    assert len(calls) == 1
+
+
+def test_hedge_fires_after_hedge_after(executor, release):
+    started = []
+
+    def fn():
+        started.append(time.monotonic())
+        if len(started) == 1:
+            release.wait(2)  # the first attempt hangs
+            return "slow"
+        return "hedged"
+
+    start = time.monotonic()
+    assert hedged_call(executor, fn, 1.0, "embedding", hedge_after=0.1, max_attempts=2) == "hedged"
+    assert len(started) == 2
+    assert started[1] - start >= 0.1
+    assert time.monotonic() - start < 0.5
+
+
+def test_failed_attempt_is_retried_without_waiting_for_hedge(executor):
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("transient")
+        return "retried"
+
+    start = time.monotonic()
+    assert hedged_call(executor, fn, 1.0, "embedding", hedge_after=0.5, max_attempts=2) == "retried"
+    assert time.monotonic() - start < 0.4
+
+
+def test_hedged_call_raises_last_error_when_every_attempt_fails(executor):
+    def fail():
+        raise RuntimeError("quota")
+
+    with pytest.raises(RuntimeError, match="quota"):
+        hedged_call(executor, fail, 1.0, "embedding", hedge_after=0.1, max_attempts=3)
+
+
+def test_hedged_call_raises_deadline_exceeded_when_budget_runs_out(executor, release):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(2)
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded, match=r"embedding timed out .*2 attempts"):
+        hedged_call(executor, fn, 0.3, "embedding", hedge_after=0.1, max_attempts=2)
+    assert 0.3 <= time.monotonic() - start < 0.6
+    assert len(calls) == 2
+
+
+def test_hedged_call_without_budget(executor):
+    with pytest.raises(DeadlineExceeded, match="No time left"):
+        hedged_call(executor, lambda: "never", 0.0, "embedding")
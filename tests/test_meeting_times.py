@@ -0,0 +1,132 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pytest
+
+from meeting_times import (
+    DAYS, MEETING_RE, SLOT_MINUTES, SLOTS_PER_DAY,
+    _parse_time_range, parse_meeting_time, parse_question_window, parse_time_window,
+)
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def meetings(mask: np.ndarray) -> list:
+    """Decode a weekly mask into sorted (day, start minute, end minute) runs."""
+    bits = np.unpackbits(mask.view(np.uint8))[:len(DAYS) * SLOTS_PER_DAY].reshape(len(DAYS), SLOTS_PER_DAY)
+    runs = []
+    for day, row in enumerate(bits):
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], row, [0]])))
+        runs.extend((DAYS[day], int(s) * SLOT_MINUTES, int(e) * SLOT_MINUTES) for s, e in zip(edges[::2], edges[1::2]))
+    return runs
+
+
+def real_time_strings() -> list:
+    times = set()
+    for path in glob.glob(os.path.join(ROOT, "primary_data", "*", "*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            times.update(item.get("time", "") for item in json.load(f))
+    return sorted(times)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("10-10:50a", (600, 650)),
+    ("9-9:50a", (540, 590)),
+    ("11-12:20p", (660, 740)),  # start keeps "a": 11 pm would be after the end
+    ("11:50a-12:50p", (710, 770)),
+    ("12-1:30p", (720, 810)),
+    ("1-5p", (780, 1020)),
+    ("2:10-4:40p", (850, 1000)),
+    ("7:15-9:45p", (1155, 1305)),
+    ("9a-12p", (540, 720)),
+    ("10:30a-12:50p", (630, 770)),
+    ("9:15-11:45a", (555, 705)),
+    ("TBA", None),
+    ("10-10:50", None),  # the end needs a or p
+])
+def test_parse_time_range(text, expected):
+    assert _parse_time_range(text) == expected
+
+
+@pytest.mark.parametrize("time_str, expected", [
+    ("MWF 10-10:50a", [("M", 600, 650), ("W", 600, 650), ("F", 600, 650)]),
+    ("TTh 1-2:30p", [("T", 780, 870), ("Th", 780, 870)]),
+    ("M 11:50a-12:50p", [("M", 710, 770)]),
+    ("MW 11-11:50a; TTh 10:30-11:50a",
+     [("M", 660, 710), ("T", 630, 710), ("W", 660, 710), ("Th", 630, 710)]),
+    ("MWF 9-9:50a; T 12-12:50p", [("M", 540, 590), ("T", 720, 770), ("W", 540, 590), ("F", 540, 590)]),
+    ("MTWThF 10:30a-12p", [(d, 630, 720) for d in ["M", "T", "W", "Th", "F"]]),
+    ("Th 10:25a-12:55p", [("Th", 625, 775)]),
+    ("TBA", []),
+    ("CIT Center (Thomas Watson CIT)", []),
+    ("", []),
+])
+def test_parse_meeting_time(time_str, expected):
+    assert meetings(parse_meeting_time(time_str)) == expected
+
+
+def test_real_meeting_times_parse_to_daytime_ranges():
+    # Every day/time pair in the catalog parses, and the a/p inference never lands outside 7a-11p
+    checked = 0
+    for time_str in real_time_strings():
+        for days, time_range in MEETING_RE.findall(time_str):
+            parsed = _parse_time_range(time_range)
+            assert parsed is not None, time_str
+            start, end = parsed
+            assert 7 * 60 <= start < end <= 23 * 60, time_str
+            checked += 1
+    assert checked > 0
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("TTh afternoons", [("T", 720, 1080), ("Th", 720, 1080)]),
+    ("MWF", [(d, 0, 1440) for d in ["M", "W", "F"]]),
+    ("M 9a-12p", [("M", 540, 720)]),
+    ("W evening", [("W", 1020, 1440)]),
+    ("Tuesdays", [("T", 0, 1440)]),
+    ("on Thursday", [("Th", 0, 1440)]),
+    ("mornings", [(d, 0, 720) for d in DAYS]),
+    ("1-3p", [(d, 780, 900) for d in DAYS]),
+])
+def test_parse_time_window(text, expected):
+    assert meetings(parse_time_window(text)) == expected
+
+
+@pytest.mark.parametrize("text", ["", None, "intro to machine learning", "TBA"])
+def test_parse_time_window_without_constraint(text):
+    assert parse_time_window(text) is None
+
+
+def test_window_filters_real_sections():
+    window = parse_time_window("TTh afternoons")
+    fits = parse_meeting_time("TTh 1-2:30p")
+    clashes = parse_meeting_time("MWF 2-2:50p")
+    assert not np.any(fits & ~window)
+    assert np.any(clashes & ~window)
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("only ones on Tuesday", [("T", 0, 1440)]),
+    ("which of those meet on TTh", [("T", 0, 1440), ("Th", 0, 1440)]),
+    ("any on MW 1-2:30p", [("M", 780, 870), ("W", 780, 870)]),
+    ("which meet MW 1-2:30p", [("M", 780, 870), ("W", 780, 870)]),
+    ("what about Th afternoons", [("Th", 720, 1080)]),
+    ("only Fridays", [("F", 0, 1440)]),
+    ("any of those in the evening", [(d, 1020, 1440) for d in DAYS]),
+])
+def test_parse_question_window(question, expected):
+    assert meetings(parse_question_window(question)) == expected
+
+
+@pytest.mark.parametrize("question", [
+    "only ones taught by F. Hamlin",
+    "which of those cover W. E. B. Du Bois",
+    "courses on T. S. Eliot",
+    "anything by M. Smith or T Jones",
+    "intro to machine learning",
+])
+def test_parse_question_window_ignores_initials(question):
+    assert parse_question_window(question) is None
@@ -0,0 +1,112 @@
+import pytest
+
+from prereq_graph import (
+    BROWN_SCHOOL, LSU_SCHOOL, PrerequisiteGraph, extract_course_codes, extract_requirement_groups,
+)
+
+
+@pytest.mark.parametrize("text, expected", [
+    # LSU grade wording is not an alternative between courses
+    (' grade of “C”or better in MATH 1550, MATH 1552 and PHYS 2110',
+     [["MATH 1550"], ["MATH 1552"], ["PHYS 2110"]]),
+    (' grade of “C” or above in ACCT 3001, ACCT 3025; and ISDS 1100, ISDS 1101 or ISDS 1102',
+     [["ACCT 3001"], ["ACCT 3025"], ["ISDS 1100", "ISDS 1101", "ISDS 1102"]]),
+    ('A grade of "C" or higher in CHEM 1202', [["CHEM 1202"]]),
+    ("A grade of C or better in MUS 2620 or MUS 2630, or permission of department", [["MUS 2620", "MUS 2630"]]),
+    # Comma lists without "or" are each required
+    ("MATH 1550, MATH 1552", [["MATH 1550"], ["MATH 1552"]]),
+    ("AEEE 7901, AEEE 7903 or AEEE 7905 or equivalent", [["AEEE 7901", "AEEE 7903", "AEEE 7905"]]),
+    ("BIOL 1001 or BIOL 1201; and CHEM 2060", [["BIOL 1001", "BIOL 1201"], ["CHEM 2060"]]),
+    ("MATH 2085 or MATH 2090; PHYS 2110", [["MATH 2085", "MATH 2090"], ["PHYS 2110"]]),
+    # "or" that does not sit between course tokens
+    ("ACCT 3021 and consent of instructor or ACCT 4022", [["ACCT 3021"], ["ACCT 4022"]]),
+    ("EXST 7004 or equivalent", [["EXST 7004"]]),
+    ("ACCT 3222; MS in accounting students or permission of instructor", [["ACCT 3222"]]),
+    # Bare numbers inherit the department
+    ("BIOL 0280 or 0470", [["BIOL 0280", "BIOL 0470"]]),
+    ("CSCI 0150 and 0160", [["CSCI 0150"], ["CSCI 0160"]]),
+    ("Permission of instructor", []),
+    ("", []),
+])
+def test_extract_requirement_groups(text, expected):
+    assert extract_requirement_groups(text) == expected
+
+
+def test_extract_course_codes():
+    assert extract_course_codes('grade of "C" or above in ACCT 2101; MATH 1431') == ["ACCT 2101", "MATH 1431"]
+    assert extract_course_codes("BIOL 0280 or 0470, BIOL 0280") == ["BIOL 0280", "BIOL 0470"]
+
+
+def lsu(code):
+    return LSU_SCHOOL, code
+
+
+@pytest.fixture
+def graph():
+    # A 1000 -> B 2000 -> C 3000 -> D 4000, plus C 3000 requiring "A 1000 or E 1500"
+    # and a same-numbered Brown course that must not mix with the LSU one
+    nodes = [lsu(c) for c in ("A 1000", "B 2000", "C 3000", "D 4000", "E 1500")] + [(BROWN_SCHOOL, "A 1000")]
+    edges = [
+        (lsu("B 2000"), lsu("A 1000"), 0),
+        (lsu("C 3000"), lsu("B 2000"), 0),
+        (lsu("C 3000"), lsu("A 1000"), 1),
+        (lsu("C 3000"), lsu("E 1500"), 1),
+        (lsu("D 4000"), lsu("C 3000"), 0),
+    ]
+    return PrerequisiteGraph.from_edges(nodes, edges)
+
+
+def test_requirement_groups(graph):
+    assert graph.requirement_groups("C 3000", LSU_SCHOOL) == [
+        [lsu("B 2000")], [lsu("A 1000"), lsu("E 1500")],
+    ]
+    assert graph.requirement_groups("A 1000", LSU_SCHOOL) == []
+    assert graph.requirement_groups("A 1000", BROWN_SCHOOL) == []
+
+
+@pytest.mark.parametrize("code, transitive, expected", [
+    ("D 4000", False, ["C 3000"]),
+    ("D 4000", True, ["A 1000", "B 2000", "C 3000", "E 1500"]),
+    ("A 1000", False, []),
+])
+def test_prerequisites(graph, code, transitive, expected):
+    assert sorted(c for _, c in graph.prerequisites(code, school=LSU_SCHOOL, transitive=transitive)) == expected
+
+
+@pytest.mark.parametrize("code, transitive, expected", [
+    ("A 1000", False, ["B 2000", "C 3000"]),
+    ("A 1000", True, ["B 2000", "C 3000", "D 4000"]),
+    ("D 4000", True, []),
+])
+def test_unlocks(graph, code, transitive, expected):
+    assert sorted(c for _, c in graph.unlocks(code, school=LSU_SCHOOL, transitive=transitive)) == expected
+
+
+@pytest.mark.parametrize("limit, expected", [
+    (1, ["C 3000"]),
+    (3, ["C 3000", "A 1000", "B 2000"]),
+    (10, ["C 3000", "A 1000", "B 2000", "E 1500"]),
+])
+def test_capped_prerequisites_nearest_first(graph, limit, expected):
+    assert [c for _, c in graph.prerequisites("D 4000", school=LSU_SCHOOL, transitive=True, limit=limit)] == expected
+
+
+@pytest.mark.parametrize("limit, expected", [
+    (2, ["B 2000", "C 3000"]),
+    (10, ["B 2000", "C 3000", "D 4000"]),
+])
+def test_capped_unlocks_nearest_first(graph, limit, expected):
+    assert [c for _, c in graph.unlocks("A 1000", school=LSU_SCHOOL, transitive=True, limit=limit)] == expected
+
+
+def test_lookup_without_school_spans_schools(graph):
+    assert sorted(graph.lookup("A 1000")) == sorted(graph.lookup("A 1000", LSU_SCHOOL) + graph.lookup("A 1000", BROWN_SCHOOL))
+    assert graph.unlocks("A 1000", school=BROWN_SCHOOL) == []
+
+
+def test_save_and_load_round_trip(graph, tmp_path):
+    path = str(tmp_path / "prereq_graph.npz")
+    graph.save(path)
+    loaded = PrerequisiteGraph.load(path)
+    assert loaded.requirement_groups("C 3000", LSU_SCHOOL) == graph.requirement_groups("C 3000", LSU_SCHOOL)
+    assert loaded.unlocks("A 1000", school=LSU_SCHOOL, transitive=True) == graph.unlocks("A 1000", school=LSU_SCHOOL, transitive=True)
@@ -0,0 +1,63 @@
+import threading
+
+import numpy as np
+
+from sessions import RetrievalSession, SessionStore
+
+
+def session(index_name: str, refs=("a", "b")) -> RetrievalSession:
+    vectors = np.eye(len(refs), 4, dtype=np.float32)
+    return RetrievalSession(index_name, np.ones(4, dtype=np.float32), list(refs), vectors, fetch_k=len(refs))
+
+
+def test_lru_eviction_beyond_max_sessions():
+    store = SessionStore(max_sessions=2, ttl_s=60)
+    store.put("s1", session("v1"))
+    store.put("s2", session("v1"))
+    assert store.get("s1") is not None  # s1 is now the most recent
+    store.put("s3", session("v1"))
+    assert store.get("s2") is None
+    assert store.get("s1") is not None
+    assert store.stats()["evicted"] == 1
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(max_sessions=4, ttl_s=0.0)
+    store.put("s1", session("v1"))
+    assert store.get("s1") is None
+    assert store.stats()["expired"] == 1
+
+
+def test_retain_index_drops_sessions_of_other_versions():
+    store = SessionStore(max_sessions=4, ttl_s=60)
+    store.put("old", session("v1"))
+    store.put("new", session("v2"))
+    assert store.retain_index("v2") == 1
+    assert store.get("old") is None
+    assert store.get("new") is not None
+    assert store.stats()["invalidated"] == 1
+
+
+def test_merge_adds_only_new_candidates():
+    pool = session("v1", refs=("a", "b"))
+    pool.merge(["b", "c"], np.eye(2, 4, k=2, dtype=np.float32), fetch_k=8)
+    assert pool.refs == ["a", "b", "c"]
+    assert pool.vectors.shape == (3, 4)
+    assert pool.fetch_k == 8
+
+
+def test_concurrent_merges_keep_refs_and_vectors_aligned():
+    pool = session("v1", refs=("a",))
+
+    def grow(prefix):
+        for i in range(200):
+            with pool.lock:
+                pool.merge([f"{prefix}{i}"], np.full((1, 4), i, dtype=np.float32), fetch_k=i)
+                assert len(pool.refs) == len(pool.vectors)
+
+    threads = [threading.Thread(target=grow, args=(prefix,)) for prefix in "xyz"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(pool.refs) == len(pool.vectors) == 601
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def wait_until(condition, timeout: float = 2.0) -> None:
+    expires_at = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < expires_at, "condition not reached"
+        time.sleep(0.001)
+
+
+def run_concurrently(flight: SingleFlight, key, fn, callers: int, release: threading.Event) -> list:
+    """Start ``callers`` threads on one key, release the leader once every follower waits, collect outcomes."""
+    outcomes = [None] * callers
+
+    def call(i: int) -> None:
+        try:
+            outcomes[i] = ("ok", flight.do(key, fn))
+        except BaseException as e:
+            outcomes[i] = ("error", e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flight.stats()["coalesced"] == callers - 1)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=2)
+    return outcomes
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+
+    def fn():
+        executions.append(1)
+        release.wait(2)
+        return {"answer": 42}
+
+    outcomes = run_concurrently(flight, "q", fn, callers=8, release=release)
+
+    assert len(executions) == 1
+    assert all(status == "ok" for status, _ in outcomes)
+    results = [value for _, value in outcomes]
+    assert all(result is results[0] for result in results)
+    stats = flight.stats()
+    assert stats == {"calls": 8, "executed": 1, "coalesced": 7, "failed": 0,
+                     "coalesced_failures": 0, "in_flight": 0}
+
+
+def test_failure_reaches_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+    error = RuntimeError("upstream down")
+
+    def fn():
+        release.wait(2)
+        raise error
+
+    outcomes = run_concurrently(flight, "q", fn, callers=5, release=release)
+
+    assert [status for status, _ in outcomes] == ["error"] * 5
+    assert all(raised is error for _, raised in outcomes)
+    stats = flight.stats()
+    assert stats["failed"] == 1
+    assert stats["coalesced_failures"] == 4
+    assert stats["in_flight"] == 0
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats()["executed"] == 2
+
+
+def test_nothing_is_cached_after_the_call_finishes():
+    flight = SingleFlight()
+    calls = []
+    for _ in range(3):
+        flight.do("q", lambda: calls.append(1))
+    assert len(calls) == 3
+    assert flight.stats()["coalesced"] == 0
+
+
+def test_failed_call_is_not_reused():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        flight.do("q", fail)
+    assert flight.do("q", lambda: "ok") == "ok"